@@ -0,0 +1,189 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Benchmark of the smals importer on synthetic Timesheet Reports.
+
+For each size and backend, the identify, file_date and extract phases are timed
+in a fresh process, which also gives the peak memory of the extraction alone.
+The writing of the extracted entries is timed too, by the printer of beancount,
+the print phase, and by utils.serialize, the write phase. The results are
+written as JSON lines, one per measurement, to track them over time. Usage:
+
+    python -m benchmarks.bench_smals [-s ROWS ...] [-b BACKEND ...] [-r REPEAT] [-d DIR] [-o OUTPUT] [-t]
+
+The input files are generated in DIR when missing, no network access is needed."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks import generate_timesheet
+
+SIZES = (1000, 100000, 1000000)
+BACKENDS = ("rows", "columnar")
+
+
+def makeImporter(backend, log_level="ERROR", day_type_rules=None, **options):
+    """Return a smals importer configured as in exemple.import, with the day type rules
+and the other options of the importer given."""
+    from importers import smals
+
+    return smals.Importer("EXTHR", "VACDAY", "WKDT", "7:36",
+                          "DaCorp",
+                          "Custom'Er",
+                          "Income:BE:WorkingDay",
+                          "Income:BE:Customer:HeureSup",
+                          "Income:BE:Customer:JourTravail",
+                          "Assets:Employer",
+                          "Assets:Employer:HeureSup",
+                          "Assets:Employer:JourConge",
+                          "Assets:Employer:JourTravail",
+                          "Assets:Employer:Sickness",
+                          "Expenses:Conge",
+                          log_level=log_level,
+                          backend=backend,
+                          day_type_rules=day_type_rules,
+                          **options)
+
+
+def _timed(function, *args):
+    """Return the result of the call and its wall clock and CPU times, in seconds."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = function(*args)
+    return result, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def measure(filename, backend, repeat, log_level, trace=False):
+    """Time the phases of the import of the file, repeat times, in the current process.
+
+Return a dict with the best wall clock and CPU times of each phase, the
+number of entries extracted and the peak resident memory of the process.
+When trace is true, the extraction is run once more under tracemalloc, and
+the memory still allocated with the entries and the peak are added."""
+    from beancount.ingest import cache
+    from beancount.ingest import extract
+    from utils import serialize
+
+    importer = makeImporter(backend, log_level)
+    phases = {}
+    entries = []
+
+    for _ in range(repeat):
+        # A new file wrapper each time, so the head of the file is read again.
+        file = cache._FileMemo(filename)
+        for phase, function in (('identify', importer.identify),
+                                ('file_date', importer.file_date),
+                                ('extract', importer.extract)):
+            result, wall, cpu = _timed(function, file)
+            best = phases.setdefault(phase, {'wall': wall, 'cpu': cpu})
+            best['wall'], best['cpu'] = min(best['wall'], wall), min(best['cpu'], cpu)
+            if phase == 'identify' and not result:
+                raise ValueError("File not identified by the importer: {}".format(filename))
+            if phase == 'extract':
+                entries = result
+
+        for phase, function in (('print', extract.print_extracted_entries),
+                                ('write', serialize.printExtractedEntries)):
+            _, wall, cpu = _timed(function, entries, io.StringIO())
+            best = phases.setdefault(phase, {'wall': wall, 'cpu': cpu})
+            best['wall'], best['cpu'] = min(best['wall'], wall), min(best['cpu'], cpu)
+
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024
+    result = {'phases': phases, 'entries': len(entries), 'peak_rss': peak}
+
+    if trace:
+        entries = None
+        tracemalloc.start()
+        entries = importer.extract(cache._FileMemo(filename))
+        retained, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['extract_memory'] = {'retained': retained, 'peak': traced_peak}
+
+    return result
+
+
+def gitRevision():
+    """Return the current git commit of the repository, None if unknown."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def inputFile(directory, rows):
+    """Return the synthetic report of the given number of rows, generated if missing."""
+    filename = generate_timesheet.defaultFileName(rows, directory)
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        generate_timesheet.generate(filename, rows)
+    return filename
+
+
+def run(sizes=SIZES, backends=BACKENDS, repeat=3, directory='benchmarks/data', log_level="ERROR",
+        trace=False):
+    """Yield one result dict per size and backend.
+
+Each measurement is done in a new process, started with the 'spawn' method, so
+the peak memory does not include the previous measurements."""
+    context = multiprocessing.get_context('spawn')
+    common = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': gitRevision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+    for rows in sizes:
+        filename = inputFile(directory, rows)
+        for backend in backends:
+            with context.Pool(1) as pool:
+                result = pool.apply(measure, (filename, backend, repeat, log_level, trace))
+
+            extract = result['phases']['extract']['wall']
+            result.update(common, benchmark='smals', backend=backend, rows=rows,
+                          bytes=os.path.getsize(filename), repeat=repeat,
+                          rows_per_second=rows / extract if extract else None)
+            yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the smals importer")
+    parser.add_argument('-s', '--size', dest='sizes', type=int, action='append',
+                        help="Number of rows of a report, repeatable, {} by default".format(SIZES))
+    parser.add_argument('-b', '--backend', dest='backends', choices=BACKENDS, action='append',
+                        help="Parsing backend, repeatable, all by default")
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help="Number of runs of each phase, the best one is kept")
+    parser.add_argument('-d', '--directory', default=os.path.join('benchmarks', 'data'),
+                        help="Directory of the generated reports")
+    parser.add_argument('-o', '--output', type=argparse.FileType('a'), default=sys.stdout,
+                        help="File the JSON lines are appended to, the standard output by default")
+    parser.add_argument('--log-level', default="ERROR", help="Log level of the importer")
+    parser.add_argument('-t', '--trace', action='store_true',
+                        help="Also measure the memory allocated by the extraction, with tracemalloc")
+    args = parser.parse_args(argv)
+
+    for result in run(args.sizes or SIZES, args.backends or BACKENDS, args.repeat,
+                      args.directory, args.log_level, args.trace):
+        args.output.write(json.dumps(result, sort_keys=True))
+        args.output.write('\n')
+        args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Benchmark of the startup of the importers of a configuration.
+
+The time to load the configuration and to identify a single file is measured
+in a fresh process, as bean-identify would do, with the importers of the
+registry built lazily, as declared, and all built at once, as a configuration
+creating its importers at load time would do. The number of modules imported
+is recorded too. The results are written as JSON lines. Usage:
+
+    python -m benchmarks.bench_startup [-c CONFIG] [-f FILE ...] [-r REPEAT] [-o OUTPUT]"""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+from benchmarks.bench_smals import gitRevision
+
+CONFIG = 'exemple.import'
+FILES = (os.path.join('input', 'smals-report-201812-cleaned.csv'),)
+MODES = ("lazy", "eager")
+
+
+def measure(config, filename, mode):
+    """Load the configuration and identify the file in the current process, a fresh one.
+
+Return a dict with the wall clock times of the loading of the configuration
+and of the identification, the number of modules imported by them and the
+names of the importers built and of the ones identifying the file."""
+    import runpy
+
+    modules = len(sys.modules)
+    start = time.perf_counter()
+    importers = runpy.run_path(config)['CONFIG']
+    if mode == "eager":
+        for lazy in importers:
+            if hasattr(lazy, 'importer'):
+                lazy.importer()
+    loaded = time.perf_counter()
+
+    from beancount.ingest import cache
+    file = cache.get_file(os.path.abspath(filename))
+    identified = [importer.name() for importer in importers if importer.identify(file)]
+    end = time.perf_counter()
+
+    return {'load': loaded - start, 'identify': end - loaded, 'total': end - start,
+            'modules': len(sys.modules) - modules,
+            'built': [importer.name() for importer in importers
+                      if not hasattr(importer, 'isBuilt') or importer.isBuilt()],
+            'identified': identified}
+
+
+def run(config=CONFIG, files=FILES, modes=MODES, repeat=5):
+    """Yield one result dict per file and mode, with the best times of repeat processes."""
+    context = multiprocessing.get_context('spawn')
+    common = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': gitRevision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+    for filename in files:
+        for mode in modes:
+            best = None
+            for _ in range(repeat):
+                with context.Pool(1) as pool:
+                    result = pool.apply(measure, (config, filename, mode))
+                if best is None or result['total'] < best['total']:
+                    best = result
+
+            best.update(common, benchmark='startup', config=config, file=filename, mode=mode,
+                        repeat=repeat)
+            yield best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the importers")
+    parser.add_argument('-c', '--config', default=CONFIG, help="Importers configuration file")
+    parser.add_argument('-f', '--file', dest='files', action='append',
+                        help="File to identify, repeatable, {} by default".format(FILES))
+    parser.add_argument('-m', '--mode', dest='modes', choices=MODES, action='append',
+                        help="Build the importers lazily or at once, repeatable, both by default")
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help="Number of processes per measurement, the best one is kept")
+    parser.add_argument('-o', '--output', type=argparse.FileType('a'), default=sys.stdout,
+                        help="File the JSON lines are appended to, the standard output by default")
+    args = parser.parse_args(argv)
+
+    for result in run(args.config, args.files or FILES, args.modes or MODES, args.repeat):
+        args.output.write(json.dumps(result, sort_keys=True))
+        args.output.write('\n')
+        args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
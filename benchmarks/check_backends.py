@@ -0,0 +1,71 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Check that the backends of the smals importer extract the same entries.
+
+A synthetic report is extracted with each backend and each table of day type
+rules of RULES, the default one and custom ones combining the actions in ways
+the default table does not, and the entries are compared. The differences are
+printed, the exit status is 1 if there is any. Usage:
+
+    python -m benchmarks.check_backends [-s ROWS] [-d DIR]"""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import sys
+
+from importers.smals import rules
+from benchmarks import bench_smals
+
+
+def _replaced(actions):
+    """Return the default rules with the actions of the worked day with half a vacation replaced."""
+    return [dict(rule, actions=actions) if rule.get('DAYTYPE3') == 'CAO' and 'DAYTYPE2' in rule else rule
+            for rule in rules.DEFAULT_RULES]
+
+
+RULES = {
+    'default': None,
+    # The whole standard work period is due, besides half a day of vacation.
+    'vacation_half_without_half_work': _replaced(['work', 'vacation_half']),
+    # Half a day of vacation, without work.
+    'vacation_half_only': _replaced(['vacation_half']),
+}
+
+
+def extract(filename, backend, day_type_rules):
+    """Return the text and metadata of the entries extracted from the file with the backend."""
+    from beancount.ingest import cache
+    from beancount.parser import printer
+
+    importer = bench_smals.makeImporter(backend, day_type_rules=day_type_rules)
+    return [(printer.format_entry(entry), sorted(entry.meta.items()))
+            for entry in importer.extract(cache._FileMemo(filename))]
+
+
+def check(filename):
+    """Yield the name of the rules and the index of the first entry differing between the backends."""
+    for name, day_type_rules in RULES.items():
+        first, *others = [extract(filename, backend, day_type_rules) for backend in bench_smals.BACKENDS]
+        for other in others:
+            if other != first:
+                index = next((index for index, (left, right) in enumerate(zip(first, other))
+                              if left != right), min(len(first), len(other)))
+                yield name, index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the entries extracted by the smals backends")
+    parser.add_argument('-s', '--size', type=int, default=10000, help="Number of rows of the report")
+    parser.add_argument('-d', '--directory', default='benchmarks/data',
+                        help="Directory of the generated reports")
+    args = parser.parse_args(argv)
+
+    differences = list(check(bench_smals.inputFile(args.directory, args.size)))
+    for name, index in differences:
+        print("Rules {}: the backends differ from the entry {}".format(name, index))
+
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
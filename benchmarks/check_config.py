@@ -0,0 +1,58 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Check that the importers of a configuration can be given as a list to utils.driver.
+
+The configuration is loaded, no importer must be built by the loading, and its
+importers are run by utils.driver.run, given as the list, pickled to the worker
+processes, and as the configuration file name, loaded again by the workers.
+The two runs must give the same results. The problems are printed, the exit
+status is 1 if there is any. Usage:
+
+    python -m benchmarks.check_config [-c CONFIG] [-j JOBS] [PATH ...]"""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import pickle
+import sys
+
+from utils import driver
+
+CONFIG = 'exemple.import'
+PATHS = ('input',)
+
+
+def check(config=CONFIG, paths=PATHS, jobs=2):
+    """Yield the description of each problem of the configuration."""
+    importers = driver.loadConfig(config)
+
+    built = [importer.name() for importer in importers
+             if hasattr(importer, 'isBuilt') and importer.isBuilt()]
+    if built:
+        yield "Importers built by the loading of the configuration: {}".format(", ".join(built))
+
+    try:
+        pickle.dumps(importers)
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        yield "Importers not picklable: {}".format(error)
+        return
+
+    if driver.run(importers, paths, jobs) != driver.run(config, paths, jobs):
+        yield "The importers given as a list do not give the results of the configuration file"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the importers of a configuration run by the driver")
+    parser.add_argument('paths', nargs='*', help="Files or directories to process, {} by default".format(PATHS))
+    parser.add_argument('-c', '--config', default=CONFIG, help="Importers configuration file")
+    parser.add_argument('-j', '--jobs', type=int, default=2, help="Number of worker processes")
+    args = parser.parse_args(argv)
+
+    problems = list(check(args.config, args.paths or PATHS, args.jobs))
+    for problem in problems:
+        print(problem)
+
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Generator of synthetic Timesheet Report CSV files.
+
+The files have the header and the mix of day types of the real reports: week-end
+days, worked days, legal holidays, vacation and sickness periods, whole or
+half days. Usage:
+
+    python -m benchmarks.generate_timesheet ROWS [-o OUTPUT] [--seed SEED] [--start D/MM/YYYY]"""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import datetime
+import os
+import random
+
+HEADER = "DATE;DAYTYPE;STD;DAYTYPE2;TIMESPENT;DAYTYPE3;TIMEREC;DAYTYPE4;TIMESPENT2"
+
+# Belgian legal holidays at a fixed date, as (day, month).
+LEGAL_HOLIDAYS = {(1, 1), (1, 5), (21, 7), (15, 8), (1, 11), (11, 11), (25, 12)}
+# Days the customer is closed, recorded as COLFE.
+CLOSING_DAYS = {(2, 11), (15, 11), (26, 12)}
+
+# Probability of each kind of working day, the remaining ones are worked days.
+DAY_KINDS = (
+    (0.030, 'vacation_start'),  # First day of a vacation of 1 to 10 days
+    (0.015, 'half_vacation'),   # Worked morning, vacation in the afternoon
+    (0.005, 'half_vacation4'),  # Half a day of vacation given by DAYTYPE4
+    (0.010, 'sickness_start'),  # First day of a sickness of 1 to 5 days
+    (0.005, 'half_sickness'),   # Worked morning, sick in the afternoon
+    (0.003, 'sickness_vacation'),  # Half sickness, half vacation
+)
+
+
+def formatMinutes(minutes):
+    return "{}:{:02d}".format(minutes // 60, minutes % 60)
+
+
+def iterRows(count, start=datetime.date(2000, 1, 3), seed=0, not_started_days=2):
+    """Yield count rows of a synthetic report, as strings, from the start date.
+
+The first not_started_days days are recorded as days before the arrival at
+the customer."""
+    generator = random.Random(seed)
+    date = start
+    absence = None
+    absence_days = 0
+
+    for index in range(count):
+        prefix = "{}/{:02d}/{};".format(date.day, date.month, date.year)
+        day = (date.day, date.month)
+
+        if index < not_started_days:
+            row = "-;0:00;;;;;;"
+        elif date.weekday() >= 5:
+            row = "WK-PT;0:00;;;;;;"
+        elif day in LEGAL_HOLIDAYS:
+            row = "07:36;7:36;;;JFR;7:36;;"
+        elif day in CLOSING_DAYS:
+            row = "07:36;7:36;;;COLFE;7:36;;"
+        else:
+            if absence_days == 0:
+                absence = None
+                draw = generator.random()
+                for probability, kind in DAY_KINDS:
+                    if draw < probability:
+                        absence = kind
+                        break
+                    draw -= probability
+                if absence == 'vacation_start':
+                    absence, absence_days = 'vacation', generator.randint(1, 10)
+                elif absence == 'sickness_start':
+                    absence, absence_days = 'sickness', generator.randint(1, 5)
+                elif absence is not None:
+                    absence_days = 1
+
+            worked = formatMinutes(int(generator.gauss(470, 20)))
+            half_worked = formatMinutes(int(generator.gauss(235, 15)))
+
+            if absence is None:
+                row = "07:36;7:36;PRE;{};;;;".format(worked)
+            elif absence == 'vacation':
+                row = "07:36;7:36;;;CAO;7:36;;"
+            elif absence == 'sickness':
+                row = "07:36;7:36;;;MAL;7:36;;"
+            elif absence == 'half_vacation':
+                row = "07:36;7:36;PRE;{};CAO;3:48;;".format(half_worked)
+            elif absence == 'half_vacation4':
+                row = "07:36;7:36;;;JFR;3:48;CAO;3:48"
+            elif absence == 'half_sickness':
+                row = "07:36;7:36;PRE;{};MAL;3:48;;".format(half_worked)
+            else:
+                row = "07:36;7:36;;;MAL;3:48;CAO;3:48"
+
+            if absence_days > 0:
+                absence_days -= 1
+
+        yield prefix + row
+        date += datetime.timedelta(days=1)
+
+
+def defaultFileName(count, directory='.', start=datetime.date(2000, 1, 3)):
+    """Return a file name identified by the smals importer, for a file of count rows."""
+    last = start + datetime.timedelta(days=count - 1)
+    return os.path.join(directory, "smals-report-{:04d}{:02d}-cleaned_synthetic-{}.csv".format(
+        last.year, last.month, count))
+
+
+def generate(filename, count, start=datetime.date(2000, 1, 3), seed=0):
+    """Write a synthetic report of count rows in the file."""
+    with open(filename, 'w', buffering=1 << 20) as output:
+        output.write(HEADER)
+        output.write('\n')
+        for row in iterRows(count, start, seed):
+            output.write(row)
+            output.write('\n')
+
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Timesheet Report CSV file")
+    parser.add_argument('rows', type=int, help="Number of rows (days) of the report")
+    parser.add_argument('-o', '--output', help="Output file, named after the last month by default")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator")
+    parser.add_argument('--start', default="3/01/2000", help="Date of the first row, D/MM/YYYY")
+    args = parser.parse_args(argv)
+
+    start = datetime.datetime.strptime(args.start, '%d/%m/%Y').date()
+    filename = args.output or defaultFileName(args.rows, start=start)
+    print(generate(filename, args.rows, start, args.seed))
+
+
+if __name__ == '__main__':
+    main()
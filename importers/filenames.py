@@ -0,0 +1,19 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""The regular expressions of the names of the files of the importers.
+
+They are used by the importers and by the configurations declaring them in a
+registry (see registry). This module imports nothing, so a configuration
+loads it without loading the importers."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+# The month of a smals report, as the named groups year and month.
+SMALS_YEAR_MONTH = r"(?P<year>\d{4})(?P<month>0[1-9]|1[0-2])"
+
+# A smals report, possibly tagged, like smals-report-201812-cleaned_quarantine.csv,
+# and compressed.
+SMALS_REPORT = r"smals-report-" + SMALS_YEAR_MONTH + r"-cleaned(_.+)*\.csv(\.gz|\.xz|\.zst)?$"
+
+# A Hetzner invoice, as downloaded, like Hetzner_2018-12-03_R0008012345.pdf or
+# R0008012345.pdf, or as archived by bean-file, like 2018-12-03.hetzner.R0008012345.pdf.
+HETZNER_INVOICE = r"(?i)(\d{4}-\d{2}-\d{2}\.)?(hetzner[_.-].*|R\d+)\.pdf$"
@@ -0,0 +1,176 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Importer for the invoices of Hetzner Online in PDF format."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import decimal
+import re
+from os import path
+
+from beancount.core import data
+from beancount.core import amount
+from beancount.ingest import importer
+
+from utils.utils import PostingPolicyEnum
+from utils.log import getLogger
+from utils import pdftext
+from utils.contentcache import ContentCache
+from utils.postingpolicy import LineItem
+
+from importers import filenames
+from importers.hetzner import invoice
+
+# The keys of the values kept in the cache for a file.
+TEXT_KEY = 'text'
+INVOICE_KEY = 'hetzner-invoice-{}'.format(invoice.PARSER_VERSION)
+
+
+class Importer(importer.ImporterProtocol):
+    """An importer for the PDF invoices of Hetzner Online."""
+
+    filename_regex = re.compile(filenames.HETZNER_INVOICE)
+
+    def __init__(self, account_liability, account_payment, policy,
+                 cache=None,
+                 log_level=None,
+                 log_sink=None,
+                 log_queued=None):
+        """An invoice is recorded as a transaction from the account_liability to
+the accounts of its items, decided by the policy, a HetznerPolicy. Its payment
+is recorded as a transaction, flagged, from the account_payment to the
+account_liability. Both are at the total of the invoice, the difference with
+the postings of the policy, if any, is posted to the VAT account of the policy.
+
+The cache, a utils.contentcache.ContentCache object or the name of its
+directory, keeps the text and the items of the invoices by content, so a PDF
+file is converted only once. Without it, they are only kept for the run.
+
+The log_* parameters are passed to utils.log.getLogger, see the smals importer."""
+        policy.validate()
+
+        self.log_parameters = (log_level, log_sink, log_queued)
+        self.logger = getLogger("hetzner", log_level, log_sink, log_queued)
+
+        self.account_liability = account_liability
+        self.account_payment = account_payment
+        self.policy = policy
+        if cache is None or isinstance(cache, str):
+            cache = ContentCache(cache)
+        self.cache = cache
+
+        self.logger.debug("Liability account: %s", self.account_liability)
+        self.logger.debug("Payment account: %s", self.account_payment)
+        self.logger.debug("Posting policy: %s", self.policy.posting_policy)
+        self.logger.info("Object initialisation done.")
+
+    def __getstate__(self):
+        """Return the state of the importer to pickle, without its logger."""
+        state = self.__dict__.copy()
+        del state['logger']
+
+        log_level, log_sink, log_queued = self.log_parameters
+        if not isinstance(log_sink, str):
+            state['log_parameters'] = (log_level, None, log_queued)
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = getLogger("hetzner", *self.log_parameters)
+
+    def __text(self, filename):
+        return self.cache.get(filename, TEXT_KEY, pdftext.toText)
+
+    def __parse(self, filename):
+        try:
+            return invoice.toJson(invoice.parse(self.__text(filename)))
+        except ValueError as error:
+            self.logger.warning("Invoice not parsed %s: %s", filename, error)
+            return None
+
+    def get_Invoice(self, filename):
+        """Return the Invoice of the PDF file, None if it is not a Hetzner invoice.
+
+It is meant to be used with the convert method of the beancount file objects,
+so identify, file_date and extract share it."""
+        try:
+            content = self.cache.get(filename, INVOICE_KEY, self.__parse)
+        except OSError as error:
+            self.logger.warning("File not converted %s: %s", filename, error)
+            return None
+
+        return invoice.fromJson(content)
+
+    def identify(self, file):
+        # The file name is checked first, so only the invoices are converted.
+        if not self.filename_regex.match(path.basename(file.name)):
+            return False
+
+        matching_result = file.convert(self.get_Invoice) is not None
+        self.logger.info("Identification result of %s: %s", file.name, matching_result)
+        return matching_result
+
+    def file_name(self, file):
+        parsed = file.convert(self.get_Invoice)
+        if parsed is None:
+            return None
+        return 'hetzner.{}.pdf'.format(parsed.number)
+
+    def file_account(self, _):
+        return self.account_liability
+
+    def file_date(self, file):
+        parsed = file.convert(self.get_Invoice)
+        return parsed.date if parsed is not None else None
+
+    def __postings(self, parsed):
+        """Return the postings of the items of the invoice, following the posting policy."""
+        rate = parsed.vat_rate if parsed.vat_rate is not None else int(self.policy.vat_rate)
+        account_of = self.policy.account
+        items = (LineItem(account_of(item.description), item.amount, rate) for item in parsed.items)
+
+        return self.policy.engine.postings(items, parsed.currency, parsed.vat)
+
+    def extract(self, file):
+        self.logger.info("Extracting transactions from file: %s", file.name)
+
+        parsed = file.convert(self.get_Invoice)
+        if parsed is None:
+            return []
+
+        postings = self.__postings(parsed)
+        total = sum((posting.units.number for posting in postings), decimal.Decimal(0))
+        # The invoice is booked and paid at its total, the difference with the
+        # postings goes to the VAT account.
+        gross = parsed.gross if parsed.gross is not None else total
+        if gross != total:
+            if self.policy.posting_policy in (PostingPolicyEnum.MULTI_NO_VAT, PostingPolicyEnum.SINGLE_NO_VAT):
+                self.logger.warning("Invoice %s has %s %s of VAT, not posted by the %s policy, "
+                                    "the VAT is posted to %s", parsed.number, gross - total,
+                                    parsed.currency, self.policy.posting_policy.name,
+                                    self.policy.account_vat)
+            else:
+                self.logger.warning("Total of invoice %s is %s, the postings sum to %s, "
+                                    "the difference is posted to %s", parsed.number, gross, total,
+                                    self.policy.account_vat)
+            postings.append(data.Posting(self.policy.account_vat,
+                                         amount.Amount(gross - total, parsed.currency),
+                                         None, None, None, None))
+
+        units = amount.Amount(gross, parsed.currency)
+        meta = data.new_metadata(file.name, 0, {'invoice': parsed.number})
+        postings.append(data.Posting(self.account_liability, -units, None, None, None, None))
+        txn_invoice = data.Transaction(meta, parsed.date, self.FLAG, invoice.SELLER,
+                                       "Invoice {}".format(parsed.number),
+                                       data.EMPTY_SET, data.EMPTY_SET, postings)
+
+        meta = data.new_metadata(file.name, 1, {'invoice': parsed.number})
+        txn_payment = data.Transaction(meta, parsed.date, "!", invoice.SELLER,
+                                       "Payment of invoice {}".format(parsed.number),
+                                       data.EMPTY_SET, data.EMPTY_SET, [
+                                           data.Posting(self.account_liability, units, None, None, None, None),
+                                           data.Posting(self.account_payment, -units, None, None, None, None)
+                                       ])
+
+        self.logger.debug("Cache hits %d, misses %d", self.cache.hits, self.cache.misses)
+        return [txn_invoice, txn_payment]
@@ -0,0 +1,136 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Parsing of the text of the Hetzner invoices.
+
+The text is the one of the PDF invoice converted with the columns of the
+table of the items on the same line (see utils.pdftext), in English or in
+German, for instance:
+
+    Hetzner Online GmbH
+    Invoice no.: R0007654321
+    Invoice date: 03/01/2019
+    Pos.  Description                                Qty.   Unit price    Amount
+    1     Cloud Server CX11 (01/12/2018-31/12/2018)  1      2.49 €        2.49 €
+    2     Storage Box BX10                           1      3.81 €        3.81 €
+    Total (excl. VAT):                                                    6.30 €
+    VAT 21 %:                                                             1.32 €
+    Total amount:                                                         7.62 €
+
+The amounts are in euro, with a dot or a comma as decimal separator."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import collections
+import datetime
+import decimal
+import re
+
+# Changed whenever the parsing changes, so the invoices parsed before are parsed again.
+PARSER_VERSION = 1
+
+CURRENCY = 'EUR'
+SELLER = 'Hetzner Online GmbH'
+
+Invoice = collections.namedtuple('Invoice', 'number date currency items net vat_rate vat gross')
+Invoice.__doc__ = """An invoice. The totals net, vat and gross are None when they are not found,
+vat_rate is the percentage of VAT of the invoice."""
+
+Item = collections.namedtuple('Item', 'position description quantity unit_price amount')
+Item.__doc__ = "A line of an invoice, the amount is without VAT."
+
+_AMOUNT = r"(-?\d[\d.,']*)\s*(?:€|EUR)?"
+_NUMBER_REGEX = re.compile(r"(?:Invoice|Rechnung)\s*(?:no\.?|number|nr\.?|-?nummer)\s*:?\s*([A-Z]*\d+)",
+                           re.IGNORECASE)
+_DATE_REGEX = re.compile(r"(?:Invoice date|Rechnungsdatum|Date|Datum)\s*:?\s*(\d{1,2})[./](\d{1,2})[./](\d{4})",
+                         re.IGNORECASE)
+_ITEM_REGEX = re.compile(r"^\s*(\d+)\s+(\S.*?)\s+(\d+(?:[.,]\d+)?)\s+(?:€\s*)?" + _AMOUNT +
+                         r"\s+(?:€\s*)?" + _AMOUNT + r"\s*$")
+_NET_REGEX = re.compile(r"(?:Total\s*\(?excl\.?\s*VAT\)?|Net total|Summe\s*\(?netto\)?|Nettobetrag)\s*:?\s*(?:€\s*)?" +
+                        _AMOUNT, re.IGNORECASE)
+_VAT_REGEX = re.compile(r"(?:VAT|USt\.?|MwSt\.?)\s*(\d+(?:[.,]\d+)?)\s*%\s*:?\s*(?:€\s*)?" + _AMOUNT,
+                        re.IGNORECASE)
+_GROSS_REGEX = re.compile(r"(?:Total amount|Total\s*\(?incl\.?\s*VAT\)?|Amount due|Gesamtbetrag|Rechnungsbetrag)"
+                          r"\s*:?\s*(?:€\s*)?" + _AMOUNT, re.IGNORECASE)
+
+
+def toDecimal(text):
+    """Convert an amount written with a dot or a comma as decimal separator to a Decimal.
+
+When both are present, the last one is the decimal separator."""
+    text = text.replace("'", "")
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    else:
+        text = text.replace(',', '.')
+
+    return decimal.Decimal(text)
+
+
+def _search(regex, text):
+    match = regex.search(text)
+    return match.groups() if match else None
+
+
+def parse(text):
+    """Return the Invoice of the text, None if it is not the one of a Hetzner invoice.
+
+A ValueError is raised if it is a Hetzner invoice without number or date."""
+    if SELLER not in text:
+        return None
+
+    number = _search(_NUMBER_REGEX, text)
+    date = _search(_DATE_REGEX, text)
+    if number is None or date is None:
+        raise ValueError("Hetzner invoice without number or date")
+
+    items = []
+    for line in text.splitlines():
+        match = _ITEM_REGEX.match(line)
+        if match:
+            position, description, quantity, unit_price, amount = match.groups()
+            items.append(Item(int(position), description, toDecimal(quantity),
+                              toDecimal(unit_price), toDecimal(amount)))
+
+    net = _search(_NET_REGEX, text)
+    vat = _search(_VAT_REGEX, text)
+    gross = _search(_GROSS_REGEX, text)
+
+    day, month, year = (int(value) for value in date)
+    return Invoice(number[0], datetime.date(year, month, day), CURRENCY, tuple(items),
+                   toDecimal(net[0]) if net else None,
+                   toDecimal(vat[0]) if vat else None,
+                   toDecimal(vat[1]) if vat else None,
+                   toDecimal(gross[0]) if gross else None)
+
+
+def toJson(invoice):
+    """Return the invoice, or None, as a value serializable as JSON."""
+    if invoice is None:
+        return None
+
+    def text(value):
+        return None if value is None else str(value)
+
+    return {'number': invoice.number, 'date': invoice.date.isoformat(), 'currency': invoice.currency,
+            'items': [[item.position, item.description, str(item.quantity), str(item.unit_price),
+                       str(item.amount)] for item in invoice.items],
+            'net': text(invoice.net), 'vat_rate': text(invoice.vat_rate), 'vat': text(invoice.vat),
+            'gross': text(invoice.gross)}
+
+
+def fromJson(content):
+    """Return the Invoice, or None, of a value returned by toJson."""
+    if content is None:
+        return None
+
+    def number(value):
+        return None if value is None else decimal.Decimal(value)
+
+    return Invoice(content['number'], datetime.date.fromisoformat(content['date']), content['currency'],
+                   tuple(Item(position, description, decimal.Decimal(quantity),
+                              decimal.Decimal(unit_price), decimal.Decimal(amount))
+                         for position, description, quantity, unit_price, amount in content['items']),
+                   number(content['net']), number(content['vat_rate']), number(content['vat']),
+                   number(content['gross']))
@@ -0,0 +1,90 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""The policy deciding how the Hetzner invoices are recorded."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import re
+
+from beancount.core import account
+
+from utils.utils import Policy, PostingPolicyEnum, VatBelgiumEnum
+from utils.postingpolicy import PostingEngine
+
+
+class HetznerPolicy(Policy):
+    """The accounts and the postings of the Hetzner invoices.
+
+Attributes:
+- posting_policy, the PostingPolicyEnum deciding the postings of the items.
+- vat_rate, the VatBelgiumEnum rate used when the invoice shows no VAT.
+- account_vat, the account of the VAT postings.
+- default_account, the account of the items matched by no pattern.
+- accounts, a list of (regular expression, account) pairs, the account of an
+  item is the one of the first expression found in its description.
+- engine, the utils.postingpolicy.PostingEngine of the posting policy, built
+  by validate."""
+
+    def __init__(self):
+        self.posting_policy = PostingPolicyEnum.SINGLE
+        self.vat_rate = VatBelgiumEnum.VAT21
+        self.account_vat = "Expenses:Taxes:VAT"
+        self.default_account = "Expenses:Hosting:Hetzner"
+        self.accounts = []
+        self.engine = None
+        self._compiled = None
+        self._by_description = {}
+
+    def validate(self):
+        """Raise a ValueError if an attribute of the policy is not valid, otherwise build
+the engine of the postings."""
+        if self.posting_policy is None or self.vat_rate is None:
+            raise ValueError("The posting policy and the VAT rate are mandatory")
+        super().validate()
+
+        for name in [self.account_vat, self.default_account] + [name for _, name in self.accounts]:
+            if not account.is_valid(name):
+                raise ValueError("Invalid account name: {}".format(name))
+
+        try:
+            self._compiled = [(re.compile(pattern), name) for pattern, name in self.accounts]
+            self._by_description = {}
+        except re.error as error:
+            raise ValueError("Invalid account pattern: {}".format(error))
+
+        self.engine = PostingEngine(self.posting_policy, self.account_vat)
+
+    def account(self, description):
+        """Return the account of an item of the invoice, from its description.
+
+The account of a description is searched once, the lines of an invoice
+often have the same description."""
+        name = self._by_description.get(description)
+        if name is not None:
+            return name
+
+        if self._compiled is None:
+            self.validate()
+
+        name = self.default_account
+        for regex, pattern_account in self._compiled:
+            if regex.search(description):
+                name = pattern_account
+                break
+
+        self._by_description[description] = name
+        return name
+
+
+def makePolicy(**attributes):
+    """Return a HetznerPolicy with the attributes given, the default ones for the others.
+
+It is meant to be given to the importer as
+deferred("importers.hetzner.policy:makePolicy", ...), see importers.registry.
+A ValueError is raised for an unknown attribute."""
+    policy = HetznerPolicy()
+    for name, value in attributes.items():
+        if name.startswith('_') or name == 'engine' or not hasattr(policy, name):
+            raise ValueError("Unknown attribute of HetznerPolicy: {}".format(name))
+        setattr(policy, name, value)
+
+    return policy
@@ -0,0 +1,169 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""A registry of the importers of a configuration, imported and built only when needed.
+
+An importer is declared by its class, as "module:Class", the arguments of its
+constructor and a regular expression matched on the base name of the files.
+The module of the importer is only imported, and the importer only built,
+when a file name matches, so running bean-identify on one file costs the
+loading of the importers of that file only. Usage, in a configuration file:
+
+    from importers.registry import Registry
+    registry = Registry()
+    registry.register("importers.smals:Importer", r"smals-report-.*\\.csv", "EXTHR", ...)
+    CONFIG = registry.config()
+
+An argument that must be built with the importer, like a policy defined in the
+package of the importer, is given as deferred("module:function", arguments...).
+The function is named, not given, so its module is only imported when the
+importer is built and the importers of the configuration can be pickled, to be
+sent to the processes of utils.driver."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import importlib
+import re
+from os import path
+
+from beancount.ingest import importer
+
+from utils.utils import extractArguments
+
+
+def _split(target, kind, form):
+    """Return the module and attribute names of a "module:attribute" target."""
+    module_name, _, attribute = target.partition(':') if isinstance(target, str) else ('', '', '')
+    if not module_name or not attribute:
+        raise ValueError("{} not given as {}: {}".format(kind, form, target))
+    return module_name, attribute
+
+
+class Deferred:
+    """An argument of an importer, the result of the call of function with arguments.
+
+The function is given as "module:function", it is imported on the first call.
+The result is validated by its validate method, when it has one. A
+ValueError is raised if the function is not given as "module:function"."""
+
+    def __init__(self, function, *args, **kwargs):
+        self.module_name, self.function_name = _split(function, 'Function', 'module:function')
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        function = getattr(importlib.import_module(self.module_name), self.function_name)
+        value = function(*self.args, **self.kwargs)
+        validate = getattr(value, 'validate', None)
+        if callable(validate):
+            validate()
+        return value
+
+
+def deferred(function, *args, **kwargs):
+    """Return an argument of an importer computed when the importer is built."""
+    return Deferred(function, *args, **kwargs)
+
+
+def _resolve(value):
+    return value() if isinstance(value, Deferred) else value
+
+
+class LazyImporter(importer.ImporterProtocol):
+    """An importer declared in a Registry, built on the first file name it matches.
+
+Parameters:
+- target, the class of the importer, as "module:Class".
+- filename_regex, the regular expression the base name of the files must
+  match, None to build the importer for any file.
+- args, kwargs, the arguments of the constructor of the importer.
+
+If the importer can not be built, the error is raised by the method called
+and by the next ones needing the importer, without building it again, and the
+files are no longer identified."""
+
+    def __init__(self, target, filename_regex, args=(), kwargs=None):
+        self.module_name, self.class_name = _split(target, 'Importer', 'module:Class')
+        self.filename_regex = re.compile(filename_regex) if filename_regex is not None else None
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.instance = None
+        self.error = None
+
+    def __getstate__(self):
+        # A copy sent to another process builds its own importer.
+        state = self.__dict__.copy()
+        state['instance'] = None
+        state['error'] = None
+        return state
+
+    def importer(self):
+        """Return the importer, imported and built on the first call."""
+        if self.error is not None:
+            raise self.error
+
+        if self.instance is None:
+            try:
+                cls = getattr(importlib.import_module(self.module_name), self.class_name)
+                self.instance = cls(*[_resolve(arg) for arg in self.args],
+                                    **{name: _resolve(arg) for name, arg in self.kwargs.items()})
+            except Exception as error:
+                self.error = error
+                raise
+
+        return self.instance
+
+    def isBuilt(self):
+        return self.instance is not None
+
+    def matches(self, filename):
+        """Check if the base name of the file matches, without building the importer."""
+        return self.filename_regex is None or bool(self.filename_regex.match(path.basename(filename)))
+
+    def name(self):
+        # The name of the importer, as given by ImporterProtocol, without building it.
+        return '{}.{}'.format(self.module_name, self.class_name)
+
+    def identify(self, file):
+        if self.error is not None or not self.matches(file.name):
+            return False
+        return self.importer().identify(file)
+
+    def file_name(self, file):
+        return self.importer().file_name(file)
+
+    def file_account(self, file):
+        return self.importer().file_account(file)
+
+    def file_date(self, file):
+        return self.importer().file_date(file)
+
+    def extract(self, file, existing_entries=None):
+        wrapped = self.importer()
+        return wrapped.extract(file, **extractArguments(wrapped, existing_entries))
+
+    @property
+    def phase_timer(self):
+        # The timer of utils.instrument, only for a built importer having one.
+        if self.instance is None or not hasattr(self.instance, 'phase_timer'):
+            raise AttributeError('phase_timer')
+        return self.instance.phase_timer
+
+    @phase_timer.setter
+    def phase_timer(self, timer):
+        self.importer().phase_timer = timer
+
+
+class Registry:
+    """The importers declared by a configuration, in order of declaration."""
+
+    def __init__(self):
+        self.importers = []
+
+    def register(self, target, filename_regex, *args, **kwargs):
+        """Declare an importer, see LazyImporter, and return it."""
+        lazy = LazyImporter(target, filename_regex, args, kwargs)
+        self.importers.append(lazy)
+        return lazy
+
+    def config(self):
+        """Return the list of the importers, to be used as the CONFIG of the configuration."""
+        return list(self.importers)
@@ -3,11 +3,15 @@
 __copyright__ = "Copyright (C) 2018  Roland Everaert"
 __license__ = "GNU GPLv2"
 
+import contextlib
 import csv
 import datetime
 import re
 import logging
 import decimal
+import os
+from array import array
+from itertools import compress
 from os import path
 
 from beancount.core import data
@@ -16,9 +20,21 @@ from beancount.core import amount
 from beancount.core import position
 from beancount.core import inventory
 from beancount.ingest import importer
-from beancount.ingest import regression
 
 from utils.utils import toAmount
+from utils.postings import PostingFactory
+from utils.log import getLogger
+from utils import csvio
+from utils import dedup
+from utils import timeparse
+from utils.identcache import IdentificationCache
+
+from importers import filenames
+from importers.smals import aggregates
+from importers.smals import checkpoint
+from importers.smals import columnar
+from importers.smals import quarantine
+from importers.smals import rules
 
 class TimesheetCsvFileDefinition:
     """A class that define the input file and provides all the facilities to read it."""
@@ -28,56 +44,74 @@ class TimesheetCsvFileDefinition:
 
         self.logger.debug("Entering Function")
 
-        # self.iso_date_regex = "(\d{4})-(0\d|1[0-2])-([0-2]\d|3[01])"
-        self.year_month_regex = "\d{4}(0\d|1[0-2])"
-        self.core_filename_regex = "smals-report-" + self.year_month_regex + "-cleaned"
-        self.extension_regex = "\.csv"
-        # self.date_prefix_regex = self.iso_date_regex
-        self.tag_suffix_regex = "(_.+)*"
+        self.logger.debug("filename_regex: %s", filenames.SMALS_REPORT)
 
-        self.logger.debug("core_filename_regex: %s", self.core_filename_regex)
+        self.filename_regex = re.compile(filenames.SMALS_REPORT)
+        self.header_regex = re.compile(
+            "DATE;DAYTYPE;STD;DAYTYPE2;TIMESPENT;DAYTYPE3;TIMEREC;DAYTYPE4;TIMESPENT2")
 
         self.csvDialect = csv.excel()
         self.csvDialect.delimiter = ';'
 
         self.logger.info("Object initialisation done.")
 
-    def get_Reader(self, input_filename):
-        """Return a csv.DictReader object"""
+    @contextlib.contextmanager
+    def get_Reader(self, input_filename, offset=0, fieldnames=None):
+        """Return a context manager giving a csv.DictReader object, the file is closed when leaving it.
+
+The file is read from the byte offset, with the fieldnames if given, from its
+header otherwise."""
         self.logger.debug("Entering Function")
 
-        reader = csv.DictReader(open(input_filename), dialect=self.csvDialect)
+        with csvio.openText(input_filename, offset) as input_file:
+            yield csv.DictReader(input_file, fieldnames, dialect=self.csvDialect)
 
         self.logger.debug("Leaving Function")
 
-        return reader
-
-    def isTimesheetFileName(self, filename):
-        """Check if the filename have the format of an invoice from Hetzner."""
+    def get_Columns(self, input_filename, lenient=False):
+        """Return the whole file as a columnar.TimesheetColumns object"""
         self.logger.debug("Entering Function")
 
-        self.logger.debug("Filename to analyse %s", filename)
-
-        matching_result = re.match(r"{}{}{}".format(
-            self.core_filename_regex, self.tag_suffix_regex, self.extension_regex), path.basename(filename))
+        with csvio.openText(input_filename) as input_file:
+            columns = columnar.TimesheetColumns(csv.reader(input_file, dialect=self.csvDialect),
+                                                lenient)
 
         self.logger.debug("Leaving Function")
 
-        return matching_result
+        return columns
+
+    def isTimesheetFileName(self, filename):
+        """Check if the filename have the format of a timesheet report."""
+        return self.filename_regex.match(path.basename(filename))
+
+    def isTimesheetHeader(self, head):
+        """Check if the beginning of the file is the header of a timesheet report."""
+        return self.header_regex.match(head)
 
     def get_DateInFileName(self, filename):
-        self.logger.debug("Entering Function")
-        self.logger.debug("Filename to analyse %s", filename)
+        """Return the first day of the month of the report, from its file name, as a
+datetime.date, None if it is not the name of a timesheet report.
 
-        dateinfile = re.findall(self.core_filename_regex, filename)[0]
-        self.logger.debug("Date element found %s", dateinfile)
-        dateinfile = "-".join(dateinfile)
+The name is matched once, by the regular expression checking its format."""
+        match = self.isTimesheetFileName(filename)
+        if match is None:
+            return None
 
-        self.logger.debug("Date in file %s", dateinfile)
-        self.logger.debug("Leaving Function")
+        dateinfile = datetime.date(int(match.group('year')), int(match.group('month')), 1)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Date in file %s: %s", filename, dateinfile)
 
         return dateinfile
 
+    def get_SeriesName(self, filename):
+        """Return the name of the series of cumulative reports of the file: its base
+name without the month nor the compression extension."""
+        name = csvio.stripCompression(path.basename(filename))
+        match = self.filename_regex.match(name)
+        if match is None:
+            return name
+        return name[:match.start('year')] + name[match.end('month'):]
+
 
 class Importer(importer.ImporterProtocol):
     """An importer for the Timesheet Report CSV files provided by one of my customer."""
@@ -93,16 +127,69 @@ class Importer(importer.ImporterProtocol):
                  account_employer_vacation,
                  account_employer_worked_day,
                  account_sickness,
-                 account_vacation):
-
-        self.logger = logging.Logger("smals", logging.DEBUG)
-
-        fh = logging.FileHandler('smals-importer.log')
-        fmtr = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(lineno)d - %(funcName)s | %(message)s')
-
-        fh.setFormatter(fmtr)
-        self.logger.addHandler(fh)
+                 account_vacation,
+                 log_level=None,
+                 log_sink=None,
+                 log_queued=None,
+                 backend="rows",
+                 identify_cache=None,
+                 checkpoint_file=None,
+                 day_type_rules=None,
+                 duplicates=None,
+                 duplicate_index=None,
+                 aggregate_index=None,
+                 errors=None,
+                 quarantine_dir=None):
+        """The log_* parameters are passed to utils.log.getLogger, the ones left
+to None are read from the SMALS_LOG_LEVEL, SMALS_LOG_FILE and SMALS_LOG_QUEUE
+environment variables. Only warnings are logged by default.
+
+The backend is the way the file is parsed by extract: "rows" reads the file
+row by row, "columnar" reads it at once in typed arrays (see columnar).
+
+The identify_cache, a utils.identcache.IdentificationCache object or the name
+of its file, keeps the results of identify between runs.
+
+The checkpoint_file is the name of a file where the state of the extraction is
+saved. When given, extract only processes the rows added to the cumulative
+report since the previous extraction (see checkpoint). It needs the "rows"
+backend, a ValueError is raised with the "columnar" one. The file keeps a state per series of reports, and is locked during an
+extraction, so it can be shared by the workers of utils.driver.
+
+The day_type_rules decide what is recorded for each combination of day types
+of a row: None for the default rules, the name of a JSON file or a list of
+rules (see rules).
+
+The duplicates parameter is what extract does with the transactions already in
+the ledger: None leaves them to beancount, "mark" marks them as duplicates and
+"drop" removes them. They are found with a utils.dedup.DuplicateIndex, the
+duplicate_index if given, built from the existing entries given by beancount
+otherwise.
+
+The aggregate_index is the name of a SQLite file where the monthly totals of
+each extraction are recorded (see aggregates).
+
+The errors parameter is what extract does with the rows that can not be
+processed: "strict" raises a ValueError for an invalid DATE or TIMESPENT and
+ignores the rows with unknown day types, "quarantine" writes all of them to a
+quarantine report, in the quarantine_dir, or the directory given by
+quarantine.defaultDirectory, never scanned with the downloads, and goes on
+(see quarantine). Left to None, it is read from the SMALS_ERRORS environment
+variable, "strict" by default."""
+        if errors is None:
+            errors = os.environ.get('SMALS_ERRORS', "strict")
+        if backend not in ("rows", "columnar"):
+            raise ValueError("Unknown backend: {}".format(backend))
+        if checkpoint_file is not None and backend != "rows":
+            raise ValueError("A checkpoint_file needs the rows backend, not {}".format(backend))
+        if duplicates not in (None, "mark", "drop"):
+            raise ValueError("Unknown duplicates processing: {}".format(duplicates))
+        if errors not in ("strict", "quarantine"):
+            raise ValueError("Unknown errors processing: {}".format(errors))
+
+        self.log_parameters = (log_level, log_sink, log_queued)
+        self.logger = getLogger("smals", log_level, log_sink, log_queued)
+        self._debug = self.logger.isEnabledFor(logging.DEBUG)
 
         self.commodity_overtime = commodity_overtime
         self.commodity_vacation_day = commodity_vacation_day
@@ -120,6 +207,22 @@ class Importer(importer.ImporterProtocol):
         self.account_employer_worked_day = account_employer_worked_day
         self.account_sickness = account_sickness
         self.account_vacation = account_vacation
+        self.backend = backend
+        if isinstance(identify_cache, str):
+            identify_cache = IdentificationCache(identify_cache)
+        self.identify_cache = identify_cache
+        self.checkpoint_file = checkpoint_file
+        self.day_type_rules = rules.toRules(day_type_rules)
+        self.duplicates = duplicates
+        self.duplicate_index = duplicate_index
+        self.aggregate_index = aggregate_index
+        self.errors = errors
+        self.quarantine_dir = quarantine_dir
+        # The existing entries last given to extract and their index.
+        self._existing_index = (None, None)
+        self.postings = PostingFactory()
+        # A utils.instrument.PhaseTimer, set while an instrumented extraction runs.
+        self.phase_timer = None
 
         self.inputFile = TimesheetCsvFileDefinition(self.logger)
 
@@ -153,64 +256,77 @@ class Importer(importer.ImporterProtocol):
             "Account to use to store number of sickness days: %s", self.account_sickness)
         self.logger.debug(
             "Account to use to record spent vacation days: %s", self.account_vacation)
+        self.logger.debug("Parsing backend: %s", self.backend)
+        self.logger.debug("Errors processing: %s", self.errors)
 
         self.logger.info("Object initialisation done.")
 
+    def __getstate__(self):
+        """Return the state of the importer to pickle, without its logger.
+
+A pickled importer, like the ones sent to worker processes, builds its own
+logger and handler when unpickled. A log sink that is not a file name is
+replaced by the default one."""
+        state = self.__dict__.copy()
+        del state['logger']
+        del state['inputFile']
+        state['_existing_index'] = (None, None)
+
+        log_level, log_sink, log_queued = self.log_parameters
+        if not isinstance(log_sink, str):
+            state['log_parameters'] = (log_level, None, log_queued)
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = getLogger("smals", *self.log_parameters)
+        self.inputFile = TimesheetCsvFileDefinition(self.logger)
+
     def __txn_vacation(self, meta, date, desc, units_vac, units_ovt, price):
         """Return a holiday transaction object."""
-        self.logger.debug("Entering Function")
+        timer = self.phase_timer
+        if timer is not None:
+            start = timer.clock()
 
         txn = data.Transaction(
             meta, date, "!", self.employer, desc, data.EMPTY_SET, data.EMPTY_SET, [
-                data.Posting(self.account_vacation, units_vac,
-                             None, None, None, None),
-                data.Posting(self.account_employer_vacation, -
-                             units_vac, None, None, None, None),
-                data.Posting(self.account_vacation, units_vac,
-                             None, price, "!", None),
-                data.Posting(self.account_employer_overtime, -
-                             units_ovt, None, None, "!", None)
+                self.postings.posting(self.account_vacation, units_vac),
+                self.postings.posting(self.account_employer_vacation,
+                                      self.postings.negative(units_vac)),
+                self.postings.posting(self.account_vacation, units_vac, price, "!"),
+                self.postings.posting(self.account_employer_overtime,
+                                      self.postings.negative(units_ovt), None, "!")
             ])
 
-        self.logger.debug('Transaction to be recorded: %s', str(txn))
-        self.logger.debug("Leaving Function")
+        if timer is not None:
+            timer.add('build', start)
+        if self._debug:
+            self.logger.debug('Transaction to be recorded: %s', txn)
 
         return txn
 
     def __txn_common(self, meta, date, acc_in, acc_out, units_common, payee="", desc=""):
         """Return a transaction object for simple transactions."""
-        self.logger.debug("Entering Function")
-
-        self.logger.debug("Receiving account: %s", acc_in)
-        self.logger.debug("Sending account: %s", acc_out)
+        timer = self.phase_timer
+        if timer is not None:
+            start = timer.clock()
 
         txn = data.Transaction(
-            meta, date, self.FLAG, payee, desc, data.EMPTY_SET, data.EMPTY_SET, [
-                data.Posting(acc_in, units_common, None, None, None, None),
-                data.Posting(acc_out, -units_common, None, None, None, None)
-            ])
+            meta, date, self.FLAG, payee, desc, data.EMPTY_SET, data.EMPTY_SET,
+            self.postings.transfer(acc_in, acc_out, units_common))
 
-        self.logger.debug('Transaction to be recorded: %s', str(txn))
-        self.logger.debug("Leaving Function")
+        if timer is not None:
+            timer.add('build', start)
+        if self._debug:
+            self.logger.debug('Transaction to be recorded: %s', txn)
 
         return txn
 
     def __str_time_to_minutes(self, time_as_str_or_tuple):
         """Convert a time period expressed as a string into a number of minutes as an int."""
-        self.logger.debug("Entering Function")
-
-        self.logger.debug("Parameter to transform: '%s'", time_as_str_or_tuple)
-        self.logger.debug("Parameter type: %s", type(time_as_str_or_tuple))
-
         if type(time_as_str_or_tuple) == str:
-            self.logger.debug("Is it in [H]H:MM format: %s", re.fullmatch(
-                "^[0-9]{1,2}:[0-5][0-9]$", time_as_str_or_tuple))
-            if re.fullmatch("^[0-9]{1,2}:[0-5][0-9]$", time_as_str_or_tuple) != None:
-                time_as_tuple = (int(time_as_str_or_tuple.split(':')[0]), int(
-                    time_as_str_or_tuple.split(':')[1]))
-            else:
-                raise ValueError("Parameter was not a string  of the form [H]H:MM: {}".format(
-                    time_as_str_or_tuple))
+            return timeparse.toMinutes(time_as_str_or_tuple)
         elif type(time_as_str_or_tuple) == tuple and len(time_as_str_or_tuple) == 2 and type(time_as_str_or_tuple[0]) == int and type(time_as_str_or_tuple[1]):
             time_as_tuple = time_as_str_or_tuple
         else:
@@ -223,19 +339,25 @@ class Importer(importer.ImporterProtocol):
         # Match if the filename is as downloaded and the header has the unique
         # fields combination we're looking for.
 
-        self.logger.debug("Entering Function")
-        self.logger.info("File to analyse: %s", str(file))
-        self.logger.debug("Header file: %s", str(file.head()))
+        # The file name is checked first, so no file content is read for
+        # most of the files of a download directory.
+        if not self.inputFile.isTimesheetFileName(file.name):
+            return False
 
-        matching_result = self.inputFile.isTimesheetFileName(file.name)
+        self.logger.info("File to analyse: %s", file.name)
 
-        if matching_result:
-            matching_result = re.match(
-                "DATE;DAYTYPE;STD;DAYTYPE2;TIMESPENT;DAYTYPE3;TIMEREC;DAYTYPE4;TIMESPENT2", file.head())
+        matching_result = None
+        if self.identify_cache is not None:
+            matching_result = self.identify_cache.get(self.name(), file.name)
 
-        self.logger.info("Identification result: %s", str(matching_result))
-        self.logger.debug("Leaving Function")
-        return (matching_result)
+        if matching_result is None:
+            # The header is kept by the file object, for the other importers.
+            matching_result = bool(self.inputFile.isTimesheetHeader(file.convert(csvio.readHeader)))
+            if self.identify_cache is not None:
+                self.identify_cache.put(self.name(), file.name, matching_result)
+
+        self.logger.info("Identification result: %s", matching_result)
+        return matching_result
 
     def file_name(self, file):
         self.logger.debug("Entering Function")
@@ -254,39 +376,197 @@ class Importer(importer.ImporterProtocol):
         # Extract the statement date from the filename.
         self.logger.debug("Entering Function")
 
-        filedate = None
-        if self.inputFile.isTimesheetFileName(file.name):
-            filedate = self.inputFile.get_DateInFileName(file.name)
+        filedate = self.inputFile.get_DateInFileName(file.name)
 
-        self.logger.info("File date used: %s", str(filedate))
+        self.logger.info("File date used: %s", filedate)
         self.logger.debug("Leaving Function")
         return filedate
 
-    def extract(self, file):
+    def extract(self, file, existing_entries=None):
         # Open the CSV file and create directives.
         self.logger.debug("Entering Function")
-        self.logger.info("Extracting transactions from file: %s", str(file))
 
-        entries = []
-        index = 0
-        units_overtime = 0
-        cur_month = 0
-        cur_year = 0
-        workday_counter = 0
+        entries = list(self.iter_extract(file))
+
+        if self.duplicates is not None:
+            index = self.__duplicate_index(existing_entries)
+            if index is not None:
+                entries = index.mark(entries, self.duplicates == "drop")
+
+        self.logger.debug("Leaving Function")
+        return entries
+
+    def __duplicate_index(self, existing_entries):
+        """Return the DuplicateIndex to find the duplicates in, None if there is none."""
+        if self.duplicate_index is not None:
+            return self.duplicate_index
+        if not existing_entries:
+            return None
+
+        # The same existing entries are given for all the files of a run.
+        entries, index = self._existing_index
+        if entries is not existing_entries:
+            index = dedup.DuplicateIndex(existing_entries)
+            self._existing_index = (existing_entries, index)
+
+        return index
+
+    def iter_extract(self, file):
+        """Yield the directives of the file as soon as they are built.
+
+The overtime and worked day transactions of a month are yielded as soon as
+the first row of the next month is read, so a caller never has to wait for
+the end of the file to get the entries of a closed month."""
+        self.logger.debug("Entering Function")
+        self.logger.info("Extracting transactions from file: %s", file.name)
+
+        self._debug = self.logger.isEnabledFor(logging.DEBUG)
+        timer = self.phase_timer
+        if timer is not None:
+            start = timer.clock()
+
+        totals = None
+        if self.aggregate_index is not None:
+            totals = aggregates.MonthlyTotals({'overtime': self.account_employer_overtime,
+                                               'worked_day': self.account_employer_worked_day,
+                                               'vacation': self.account_employer_vacation,
+                                               'sickness': self.account_sickness})
+            # A quarantine report only has some rows of its months, their totals
+            # are added to the ones of the original report.
+            totals.incremental = quarantine.isReport(file.name)
+
+        rejected = None
+        if self.errors == "quarantine":
+            rejected = quarantine.Quarantine(file.name, self.quarantine_dir)
+
+        if self.backend == "columnar":
+            entries = self.__iter_extract_columnar(file, rejected)
+        elif self.checkpoint_file is not None:
+            entries = self.__iter_extract_incremental(file, totals, rejected)
+        else:
+            entries = self.__iter_rows_of_file(file, rejected)
+
+        if totals is None:
+            yield from entries
+        else:
+            for entry in entries:
+                totals.add(entry)
+                yield entry
+            with aggregates.AggregateIndex(self.aggregate_index) as index:
+                index.update(self.account_employer_root, totals, file.name)
+
+        if rejected:
+            report = rejected.save()
+            self.logger.warning("%d row(s) of %s quarantined%s", len(rejected), file.name,
+                                ", see {}".format(report) if report is not None else "")
+
+        if timer is not None:
+            # The phase not timed on its own is the rest of the extraction.
+            timer.remainder('build' if self.backend == "columnar" else 'classify', start)
+        if self._debug:
+            self.logger.debug("Parsing caches: %s", timeparse.cacheInfo())
+            self.logger.debug("Posting caches: %s", self.postings.cacheInfo())
+        self.logger.debug("Leaving Function")
+
+    def __iter_rows_of_file(self, file, rejected=None):
+        with self.inputFile.get_Reader(file.name) as reader:
+            yield from self.__iter_rows(file, reader, checkpoint.ExtractionState(), rejected)
+
+    def __iter_extract_incremental(self, file, totals=None, rejected=None):
+        """Yield the directives of the rows of the file after the saved checkpoint.
+
+The checkpoint is the one of the series of the report, locked until it is
+updated, once all the directives have been yielded. The whole file is
+processed if there is no checkpoint or if the part of the file processed when
+it was saved has changed since. The totals, an aggregates.MonthlyTotals, are
+marked as incremental when the extraction is resumed."""
+        with checkpoint.locked(self.checkpoint_file):
+            yield from self.__iter_extract_locked(file, totals, rejected)
+
+    def __iter_extract_locked(self, file, totals, rejected):
+        series = self.inputFile.get_SeriesName(file.name)
+        state = checkpoint.load(self.checkpoint_file, series)
+
+        # The digests are the ones of the decompressed content of compressed files.
+        with csvio.openBinary(file.name) as binary_file:
+            prefix_digest, digest, size = checkpoint.digestFile(
+                binary_file, state.offset if state is not None else 0)
+
+        if state is None or prefix_digest != state.digest:
+            if state is not None:
+                self.logger.warning("The rows already processed have changed, full extraction of: %s",
+                                    file.name)
+            state = checkpoint.ExtractionState()
+        else:
+            self.logger.info("Resuming extraction at row %d of: %s", state.rows, file.name)
+            if totals is not None:
+                totals.incremental = True
+
+        with self.inputFile.get_Reader(file.name, state.offset, state.fieldnames) as reader:
+            state.fieldnames = reader.fieldnames
+            yield from self.__iter_rows(file, reader, state, rejected)
+
+        state.offset = size
+        state.digest = digest
+        checkpoint.save(self.checkpoint_file, series, state)
+
+    def __iter_rows(self, file, rows, state, rejected=None):
+        """Yield the directives of the rows, read as dictionaries.
+
+The state, a checkpoint.ExtractionState, gives the month in progress before
+the first row and is updated with the one after the last row. Only the part of
+the month totals not already booked is recorded.
+
+The rows that can not be processed are added to rejected, a
+quarantine.Quarantine, if given."""
+        # Evaluate the log levels once, so the logging calls done for every
+        # row cost nothing when they are disabled.
+        debug = self._debug
+        verbose = self.logger.isEnabledFor(logging.INFO)
+
+        index = state.rows - 1
+        # The index of the last row with a valid date.
+        last = index
+        units_overtime = state.units_overtime
+        cur_month = state.cur_month
+        cur_year = state.cur_year
+        workday_counter = state.workday_counter
+        booked_overtime = state.booked_overtime
+        booked_workdays = state.booked_workdays
+        wk_period = state.wk_period
+        wk_period_full = state.wk_period_full
+        # Are there rows of the current month to record?
+        pending = False
+
+        timer = self.phase_timer
+        if timer is not None:
+            rows = timer.iterate('decode', rows)
+
+        classify = self.day_type_rules.classify
+        unknown = rules.UnknownDayTypes()
+        std = self.standard_work_period
+        half_std = int(std / 2)
 
         self.logger.debug(
             'Standard working time period in minutes: %d', self.standard_work_period)
 
-        for index, row in enumerate(self.inputFile.get_Reader(file.name)):
-            self.logger.debug('Data in row: %s', str(row))
+        for index, row in enumerate(rows, state.rows):
+            if debug:
+                self.logger.debug('Data in row: %s', row)
             meta = data.new_metadata(file.name, index)
             meta_w_month = data.new_metadata(file.name, index)
-            date = datetime.datetime.strptime(row['DATE'], '%d/%m/%Y').date()
+            try:
+                date = timeparse.toDate(row['DATE'])
+            except ValueError as error:
+                if rejected is None:
+                    raise
+                rejected.add(index, row, "invalid DATE: {}".format(error))
+                continue
+            last = index
             day, month, year = row['DATE'].split('/')
-            self.logger.debug("Year: %s", year)
-            self.logger.debug("Current Year: %s", cur_year)
-            self.logger.debug("Month: %s", month)
-            self.logger.debug("Current Month: %s", cur_month)
+            if debug:
+                self.logger.debug("Year: %s, current year: %s, month: %s, current month: %s",
+                                  year, cur_year, month, cur_month)
 
             if cur_month == 0:
                 cur_month = month
@@ -301,180 +581,264 @@ class Importer(importer.ImporterProtocol):
                 cur_month = month
                 cur_year = year
 
-                txn = self.__txn_common(meta_w_month,
-                                        date,
-                                        self.account_employer_overtime,
-                                        self.account_customer_overtime,
-                                        toAmount(units_overtime,
-                                                 self.commodity_overtime),
-                                        self.customer)
-                self.logger.info('Overtime recorded at date: %s', date)
-
-                entries.append(txn)
-                units_overtime = 0
-                txn = self.__txn_common(meta_w_month,
-                                        date,
-                                        self.account_employer_worked_day,
-                                        self.account_customer_worked_day,
-                                        toAmount(workday_counter,
-                                                 self.commodity_workday),
-                                        self.customer)
-                self.logger.info(
-                    'Number of worked day recorded at date: %s', workday_counter)
+                if pending:
+                    txn = self.__txn_common(meta_w_month,
+                                            date,
+                                            self.account_employer_overtime,
+                                            self.account_customer_overtime,
+                                            toAmount(units_overtime - booked_overtime,
+                                                     self.commodity_overtime),
+                                            self.customer)
+                    if verbose:
+                        self.logger.info('Overtime recorded at date: %s', date)
+
+                    yield txn
+                    txn = self.__txn_common(meta_w_month,
+                                            date,
+                                            self.account_employer_worked_day,
+                                            self.account_customer_worked_day,
+                                            toAmount(workday_counter - booked_workdays,
+                                                     self.commodity_workday),
+                                            self.customer)
+                    if verbose:
+                        self.logger.info(
+                            'Number of worked day recorded at date: %s', workday_counter)
 
-                entries.append(txn)
+                    yield txn
+
+                units_overtime = 0
                 workday_counter = 0
+                booked_overtime = 0
+                booked_workdays = 0
+
+            pending = True
 
-            dtype = row['DAYTYPE']
-            dtype2 = row['DAYTYPE2']
-            dtype3 = row['DAYTYPE3']
-            dtype4 = row['DAYTYPE4']
+            combination = (row['DAYTYPE'], row['DAYTYPE2'], row['DAYTYPE3'], row['DAYTYPE4'])
+            action = classify(combination)
 
-            self.logger.debug('Day of week type: %s', dtype)
-            self.logger.debug('Work day type 1: %s', dtype2)
-            self.logger.debug('Work day type 2: %s', dtype3)
+            if debug:
+                self.logger.debug('Day types: %s, action: %#x', combination, action)
+
+            # If it is a week-end day, a legal holiday or a day for which I was not yet at Smals, skip it.
+            if action & rules.SKIP:
+                if verbose:
+                    self.logger.info('Non-worked day detected, skip it.')
+                continue
 
-            # If it is a week-end day or a day for which I was not yet at Smals, skip it.
-            if dtype in ["WK-PT", "-"]:
-                self.logger.info('Week-end day detected.')
+            # In quarantine, no part of a row with unknown day types is recorded,
+            # so it is recorded at once when the row is corrected.
+            if action & rules.UNKNOWN and rejected is not None:
+                rejected.add(index, row, "unknown day types")
                 continue
 
             # If it is a work day, check if some overtime can be added to the overtime account.
-            if dtype2 == "PRE":
-                self.logger.info('Work day detected.')
+            if action & rules.WORK:
+                if verbose:
+                    self.logger.info('Work day detected.')
+
+                try:
+                    wk_time = self.__str_time_to_minutes(row['TIMESPENT'])
+                except ValueError as error:
+                    if rejected is None:
+                        raise
+                    rejected.add(index, row, "invalid TIMESPENT: {}".format(error))
+                    continue
+                wk_period_full = std
+                wk_period = half_std if action & rules.HALF_WORK else std
 
-                wk_time = self.__str_time_to_minutes(row['TIMESPENT'])
-                wk_period_full = self.standard_work_period
+                if debug:
+                    self.logger.debug('Worked time: %s', wk_time)
 
-                self.logger.debug('Worked time: %s', str(wk_time))
+            # Check if a part of the day was a vacation
+            if action & rules.VACATION_HALF:
+                if verbose:
+                    self.logger.info('Half a day was a vacation, record it.')
+                yield self.__txn_vacation(meta, date, "Demi-jour de congé",
+                                          toAmount(0.5, self.commodity_vacation_day),
+                                          toAmount(half_std, self.commodity_overtime),
+                                          toAmount(std, self.commodity_overtime))
 
-                if dtype3 in ["CAO", "MAL"]:
-                    wk_period = int(wk_period_full / 2)
-                else:
-                    wk_period = wk_period_full
+            if action & (rules.SICK_FULL | rules.SICK_HALF):
+                yield self.__txn_common(meta,
+                                        date,
+                                        self.account_sickness,
+                                        self.account_working_day,
+                                        toAmount(1 if action & rules.SICK_FULL else 0.5,
+                                                 self.commodity_workday),
+                                        self.employer,
+                                        "Incapacité de travail"
+                                        )
 
-                # Check if a part of the day was a vacation
-                if dtype3 == "CAO":
+            # If it is a work day, but I was on vacation, add an entry for a vacation day.
+            if action & rules.VACATION_FULL:
+                if verbose:
+                    self.logger.info('Vacation day detected, record it.')
+                yield self.__txn_vacation(meta, date, "Congé",
+                                          toAmount(1, self.commodity_vacation_day),
+                                          toAmount(std, self.commodity_overtime),
+                                          toAmount(std, self.commodity_overtime))
+
+            # Half a day of vacation given by DAYTYPE4, it is half of the
+            # standard work period, whatever the previous days were.
+            if action & rules.VACATION_HALF_DT4:
+                if verbose:
                     self.logger.info('Half a day was a vacation, record it.')
-                    txn = self.__txn_vacation(meta, date, "Demi-jour de congé",
-                                              toAmount(0.5,
-                                                       self.commodity_vacation_day),
-                                              toAmount(wk_period,
-                                                       self.commodity_overtime),
-                                              toAmount(wk_period_full,
-                                                       self.commodity_overtime)
-                                              )
-                    self.logger.info('Vacation date: %s', date)
-                    entries.append(txn)
-
-                if dtype3 == "MAL":
-                    txn = self.__txn_common(meta,
-                                            date,
-                                            self.account_sickness,
-                                            self.account_working_day,
-                                            toAmount(0.5,
-                                                     self.commodity_workday),
-                                            self.employer,
-                                            "Incapacité de travail"
-                                            )
-                    entries.append(txn)
-
-                self.logger.info(
-                    'Worked period for the day (in Minutes): %s', str(wk_period))
+                yield self.__txn_vacation(meta, date, "Demi-jour de congé",
+                                          toAmount(0.5, self.commodity_vacation_day),
+                                          toAmount(half_std, self.commodity_overtime),
+                                          toAmount(std, self.commodity_overtime))
 
+            if action & rules.WORK:
                 overtime = wk_time - wk_period
                 workday_counter += 1
-
-                self.logger.debug('Overtime for the day: %s', str(overtime))
-
                 units_overtime += overtime
-                self.logger.info(
-                    'Cumulative overtime for the month: %g', units_overtime)
-            else:
-                # If it is a work day, but it was a legal holiday, skip it.
-                if dtype3 in ["JFR", "COLFE"] and dtype4 == '':
-                    self.logger.info('Non-worked day detected, skip it.')
-                    continue
 
-                if dtype3 == "MAL":
-                    if dtype4 == '':
-                        u = 1
-                    else:
-                        u = 0.5
+                if verbose:
+                    self.logger.info('Worked period for the day (in Minutes): %s, overtime: %s, '
+                                     'cumulative overtime for the month: %g',
+                                     wk_period, overtime, units_overtime)
 
-                    txn = self.__txn_common(meta,
-                                            date,
-                                            self.account_sickness,
-                                            self.account_working_day,
-                                            toAmount(u,
+            if action & rules.UNKNOWN:
+                unknown.add(combination, row)
+
+        # When there is no more row to process, create a transaction with the remaining overtime
+        if pending:
+            self.logger.debug(
+                'End of file reached. Record remaining overtime and number of worked days.')
+            # A new dictionary, the one of the last row may already be in a yielded transaction.
+            meta_w_month = data.new_metadata(file.name, last)
+            meta_w_month['worked_period'] = "{}-{}".format(cur_year, cur_month)
+            txn = self.__txn_common(meta_w_month,
+                                    date,
+                                    self.account_employer_overtime,
+                                    self.account_customer_overtime,
+                                    toAmount(units_overtime - booked_overtime,
+                                             self.commodity_overtime),
+                                    self.customer)
+            self.logger.info('Overtime recorded at date: %s', date)
+            yield txn
+
+            txn = self.__txn_common(meta_w_month,
+                                    date,
+                                    self.account_employer_worked_day,
+                                    self.account_customer_worked_day,
+                                    toAmount(workday_counter - booked_workdays,
+                                             self.commodity_workday),
+                                    self.customer)
+            self.logger.info(
+                'Number of worked days recorded at date: %s', workday_counter)
+            yield txn
+
+            booked_overtime = units_overtime
+            booked_workdays = workday_counter
+
+        unknown.log(self.logger, file.name)
+        if timer is not None:
+            timer.count('rows', index + 1 - state.rows)
+
+        state.rows = index + 1
+        state.cur_month = cur_month
+        state.cur_year = cur_year
+        state.units_overtime = units_overtime
+        state.workday_counter = workday_counter
+        state.booked_overtime = booked_overtime
+        state.booked_workdays = booked_workdays
+        state.wk_period = wk_period
+        state.wk_period_full = wk_period_full
+
+    def __iter_extract_columnar(self, file, rejected=None):
+        """Yield the directives of the file, parsed by the columnar backend.
+
+The directives are the same, in the same order, as the ones built row by row,
+and so are the rows added to rejected, a quarantine.Quarantine, if given."""
+        timer = self.phase_timer
+        if timer is not None:
+            start = timer.clock()
+
+        columns = self.inputFile.get_Columns(file.name, rejected is not None)
+        if timer is not None:
+            timer.add('decode', start)
+            timer.count('rows', columns.size)
+            start = timer.clock()
+
+        actions, totals = columns.classify(self.standard_work_period, self.day_type_rules)
+        if rejected is not None:
+            for index, (reason, row) in columns.invalid.items():
+                rejected.add(index, row, reason)
+        emitting = array('B', (not action & rules.SKIP for action in actions))
+        if timer is not None:
+            timer.add('classify', start)
+
+        std = self.standard_work_period
+        half_std = int(std / 2)
+        previous = None
+        unknown = rules.UnknownDayTypes()
+
+        for start, end, units_overtime, workday_counter in totals:
+            # The totals of the previous month are dated at the first row of the new one.
+            if previous is not None:
+                yield from self.__txn_month(file, start, columns, *previous)
+            previous = (columns.periods[columns.months[start]], units_overtime, workday_counter)
+
+            for index in compress(range(start, end), emitting[start:end]):
+                action = actions[index]
+                meta = data.new_metadata(file.name, columns.fileIndex(index))
+                date = columns.date(index)
+
+                if action & rules.VACATION_HALF:
+                    yield self.__txn_vacation(meta, date, "Demi-jour de congé",
+                                              toAmount(0.5, self.commodity_vacation_day),
+                                              toAmount(half_std, self.commodity_overtime),
+                                              toAmount(std, self.commodity_overtime))
+
+                if action & (rules.SICK_FULL | rules.SICK_HALF):
+                    yield self.__txn_common(meta, date, self.account_sickness, self.account_working_day,
+                                            toAmount(1 if action & rules.SICK_FULL else 0.5,
                                                      self.commodity_workday),
-                                            self.employer,
-                                            "Incapacité de travail"
-                                            )
-                    entries.append(txn)
+                                            self.employer, "Incapacité de travail")
 
-                # If it is a work day, but I was on vacation, add an entry for a vacation day.
-                if dtype3 == "CAO":
-                    self.logger.info('Vacation day detected, record it.')
-                    txn = self.__txn_vacation(meta, date, "Congé",
-                                              toAmount(1,
-                                                       self.commodity_vacation_day),
-                                              toAmount(self.standard_work_period,
-                                                       self.commodity_overtime),
-                                              toAmount(self.standard_work_period,
-                                                       self.commodity_overtime)
-                                              )
-                    self.logger.info('Vacation date: %s', date)
-                    entries.append(txn)
-                else:
-                    if dtype4 == "CAO":
-                        wk_period = int(wk_period / 2)
-                        txn = self.__txn_vacation(meta, date, "Demi-jour de congé",
-                                                  toAmount(0.5,
-                                                           self.commodity_vacation_day),
-                                                  toAmount(wk_period,
-                                                           self.commodity_overtime),
-                                                  toAmount(wk_period_full,
-                                                           self.commodity_overtime)
-                                                  )
-                        self.logger.info('Vacation date: %s', date)
-                        entries.append(txn)
-                    else:
-                        self.logger.warning(
-                            "Unknown day type detected, row ignored.")
-                        self.logger.warning('Data in row: %s', str(row))
-                        continue
+                if action & rules.VACATION_FULL:
+                    yield self.__txn_vacation(meta, date, "Congé",
+                                              toAmount(1, self.commodity_vacation_day),
+                                              toAmount(std, self.commodity_overtime),
+                                              toAmount(std, self.commodity_overtime))
 
-        # When there is no more row to process, create a transaction with the remaining overtime
-        self.logger.debug(
-            'End of file reached. Record remaining overtime and number of worked days.')
-        meta_w_month['worked_period'] = "{}-{}".format(cur_year, cur_month)
-        txn = self.__txn_common(meta_w_month,
-                                date,
+                if action & rules.VACATION_HALF_DT4:
+                    yield self.__txn_vacation(meta, date, "Demi-jour de congé",
+                                              toAmount(0.5, self.commodity_vacation_day),
+                                              toAmount(half_std, self.commodity_overtime),
+                                              toAmount(std, self.commodity_overtime))
+
+                if action & rules.UNKNOWN:
+                    unknown.add(tuple(columns.raw[field][index] for field in rules.FIELDS),
+                                {name: values[index] for name, values in columns.raw.items()})
+
+        if previous is not None:
+            yield from self.__txn_month(file, columns.size - 1, columns, *previous)
+
+        unknown.log(self.logger, file.name)
+
+    def __txn_month(self, file, index, columns, period, units_overtime, workday_counter):
+        """Yield the overtime and worked day transactions of a month, dated at the row index."""
+        meta_w_month = data.new_metadata(file.name, columns.fileIndex(index))
+        meta_w_month['worked_period'] = period
+        date = columns.date(index)
+
+        yield self.__txn_common(meta_w_month, date,
                                 self.account_employer_overtime,
                                 self.account_customer_overtime,
-                                toAmount(units_overtime,
-                                         self.commodity_overtime),
+                                toAmount(units_overtime, self.commodity_overtime),
                                 self.customer)
-        self.logger.info('Overtime recorded at date: %s', date)
-        entries.append(txn)
-
-        txn = self.__txn_common(meta_w_month,
-                                date,
+        yield self.__txn_common(meta_w_month, date,
                                 self.account_employer_worked_day,
                                 self.account_customer_worked_day,
-                                toAmount(workday_counter,
-                                         self.commodity_workday),
+                                toAmount(workday_counter, self.commodity_workday),
                                 self.customer)
-        self.logger.info(
-            'Number of worked days recorded at date: %s', workday_counter)
-        entries.append(txn)
-
-        self.logger.debug("Leaving Function")
-        return entries
 
 # def test():
-#     # Create an importer instance for running the regression tests.
+#     # Create an importer instance for running the regression tests. The
+#     # regression module imports pytest, it is only imported for the tests.
+#     from beancount.ingest import regression
 #     importer = Importer("EXTHR", "VACDAY", "7:36", "My Employer s.a.", "Customer s.a.",
 #                         "Income:BE:Customer:HeureSup",
 #                         "Assets:BE:Employer",
@@ -0,0 +1,30 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Commands of the smals importer. Usage:
+
+    python -m importers.smals COMMAND [ARGUMENTS...]
+
+The commands are:
+- aggregates, query the index of the monthly totals (see aggregates)."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import sys
+
+from importers.smals import aggregates
+
+COMMANDS = {
+    'aggregates': aggregates.main,
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        sys.stderr.write(__doc__.split("\n\n", 1)[1] + "\n")
+        return 2
+
+    return COMMANDS[argv[0]](argv[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
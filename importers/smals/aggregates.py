@@ -0,0 +1,185 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""An index of the monthly totals of the Timesheet Reports, stored in a SQLite database.
+
+For each employer account and each month (the worked_period, YYYY-MM), the
+index holds the overtime earned and the overtime converted into vacation,
+in minutes, and the number of worked, vacation and sickness days. It is
+updated by the importer at the end of each extraction, so the balances can
+be queried without parsing the reports or loading the ledger. Usage:
+
+    python -m importers.smals aggregates INDEX [-a ACCOUNT] [-f YYYY-MM] [-t YYYY-MM] [-b] [-j]"""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import collections
+import datetime
+import json
+import sqlite3
+
+COLUMNS = ('overtime', 'vacation_overtime', 'worked_days', 'vacation_days', 'sickness_days')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS months (
+    account TEXT NOT NULL,
+    period TEXT NOT NULL,
+    overtime INTEGER NOT NULL DEFAULT 0,
+    vacation_overtime INTEGER NOT NULL DEFAULT 0,
+    worked_days REAL NOT NULL DEFAULT 0,
+    vacation_days REAL NOT NULL DEFAULT 0,
+    sickness_days REAL NOT NULL DEFAULT 0,
+    source TEXT,
+    updated TEXT,
+    PRIMARY KEY (account, period)
+)"""
+
+Month = collections.namedtuple('Month', ('account', 'period') + COLUMNS)
+
+
+def toPeriod(value):
+    """Return the YYYY-MM period of a date or of a YYYY-M[M] string."""
+    if isinstance(value, datetime.date):
+        return "{:04d}-{:02d}".format(value.year, value.month)
+
+    year, _, month = value.partition('-')
+    return "{:04d}-{:02d}".format(int(year), int(month))
+
+
+class MonthlyTotals:
+    """The totals per month of the transactions of an extraction.
+
+Parameters:
+- accounts, the accounts of the importer, a dict with the keys overtime,
+  worked_day, vacation and sickness, giving the accounts of the employer
+  whose postings are counted.
+
+The incremental attribute tells if the transactions only cover the rows added
+since a previous extraction, their totals are then added to the index."""
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.months = collections.OrderedDict()
+        self.incremental = False
+
+    def add(self, entry):
+        """Add the postings of the transaction to the totals of its month."""
+        accounts = self.accounts
+        worked_period = entry.meta.get('worked_period')
+        period = toPeriod(worked_period if worked_period is not None else entry.date)
+        totals = self.months.get(period)
+        if totals is None:
+            totals = self.months[period] = dict.fromkeys(COLUMNS, 0)
+
+        for posting in entry.postings:
+            number = posting.units.number
+            if posting.account == accounts['overtime']:
+                # The month totals earn overtime, the vacations consume it.
+                if worked_period is not None:
+                    totals['overtime'] += number
+                else:
+                    totals['vacation_overtime'] -= number
+            elif posting.account == accounts['worked_day'] and worked_period is not None:
+                totals['worked_days'] += number
+            elif posting.account == accounts['vacation']:
+                totals['vacation_days'] -= number
+            elif posting.account == accounts['sickness']:
+                totals['sickness_days'] += number
+
+
+class AggregateIndex:
+    """The SQLite database of the monthly totals, to be closed after use."""
+
+    def __init__(self, filename, timeout=30.0):
+        self.connection = sqlite3.connect(filename, timeout=timeout)
+        self.connection.execute(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def update(self, account, totals, source=None):
+        """Record the MonthlyTotals of an extraction for the account.
+
+The totals of the months replace the ones of the index, or are added to them
+if the extraction was incremental."""
+        updated = datetime.datetime.now().isoformat(timespec='seconds')
+        if totals.incremental:
+            statement = """
+                INSERT INTO months VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (account, period) DO UPDATE SET
+                    overtime = overtime + excluded.overtime,
+                    vacation_overtime = vacation_overtime + excluded.vacation_overtime,
+                    worked_days = worked_days + excluded.worked_days,
+                    vacation_days = vacation_days + excluded.vacation_days,
+                    sickness_days = sickness_days + excluded.sickness_days,
+                    source = excluded.source, updated = excluded.updated"""
+        else:
+            statement = "INSERT OR REPLACE INTO months VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+        with self.connection:
+            self.connection.executemany(statement, (
+                (account, period, int(values['overtime']), int(values['vacation_overtime']),
+                 float(values['worked_days']), float(values['vacation_days']),
+                 float(values['sickness_days']), source, updated)
+                for period, values in totals.months.items()))
+
+    def months(self, account=None, start=None, end=None):
+        """Return the Month totals, in order of account and period, between the start and
+end periods included, if given."""
+        query = "SELECT account, period, {} FROM months WHERE 1".format(", ".join(COLUMNS))
+        parameters = []
+        for condition, value in (("account = ?", account), ("period >= ?", start), ("period <= ?", end)):
+            if value is not None:
+                query += " AND " + condition
+                parameters.append(toPeriod(value) if condition.startswith("period") else value)
+
+        return [Month(*row) for row in self.connection.execute(query + " ORDER BY account, period",
+                                                               parameters)]
+
+    def balances(self, account=None, start=None, end=None):
+        """Return the Month totals cumulated since the first month of each account.
+
+The start period only limits the months returned, the balances include the
+months before it."""
+        balances = []
+        running = {}
+        for month in self.months(account, None, end):
+            values = running.setdefault(month.account, dict.fromkeys(COLUMNS, 0))
+            for column in COLUMNS:
+                values[column] += getattr(month, column)
+            if start is None or month.period >= toPeriod(start):
+                balances.append(Month(month.account, month.period, **values))
+
+        return balances
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m importers.smals aggregates",
+                                     description="Query the monthly totals of the Timesheet Reports")
+    parser.add_argument('index', help="The SQLite file of the index")
+    parser.add_argument('-a', '--account', help="Only the months of this employer account")
+    parser.add_argument('-f', '--from', dest='start', metavar='YYYY-MM', help="First month")
+    parser.add_argument('-t', '--to', dest='end', metavar='YYYY-MM', help="Last month")
+    parser.add_argument('-b', '--balance', action='store_true',
+                        help="Show the balances since the first month rather than the monthly totals")
+    parser.add_argument('-j', '--json', action='store_true', help="Output JSON lines")
+    args = parser.parse_args(argv)
+
+    with AggregateIndex(args.index) as index:
+        query = index.balances if args.balance else index.months
+        months = query(args.account, args.start, args.end)
+
+    if args.json:
+        for month in months:
+            print(json.dumps(month._asdict()))
+        return
+
+    print("{:<30} {:<7} {:>9} {:>9} {:>7} {:>8} {:>8}".format(
+        "account", "period", "overtime", "converted", "worked", "vacation", "sickness"))
+    for month in months:
+        print("{:<30} {:<7} {:>9} {:>9} {:>7g} {:>8g} {:>8g}".format(*month))
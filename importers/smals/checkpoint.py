@@ -0,0 +1,139 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Checkpoint of the incremental extraction of the cumulative Timesheet Reports.
+
+The customer sends every month a report containing all the rows since the
+beginning. The checkpoint records the state of the extraction at the end of
+the part of the report already processed (the prefix), with a digest of that
+prefix. As long as the prefix of a new report is identical, only the rows
+after it are parsed.
+
+A checkpoint file keeps one state per series of reports, the reports whose
+names only differ by their month. An extraction holds a lock on the file from
+the loading of the state to its saving, so the processes extracting reports
+with the same checkpoint file, like the workers of utils.driver, never resume
+from the same state. The lock needs the fcntl module, it is not taken on the
+systems without it."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import contextlib
+import hashlib
+import json
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from utils.utils import writeJson
+
+VERSION = 2
+CHUNK_SIZE = 1 << 20
+
+
+class ExtractionState:
+    """The running state of the row by row extraction.
+
+Attributes:
+- rows, the number of rows processed, the index of the next row.
+- offset, the size in bytes of the processed prefix of the file.
+- digest, the SHA-256 digest of the processed prefix.
+- fieldnames, the fields of the header of the file.
+- cur_month, cur_year, the month being accumulated, as found in the DATE field.
+- units_overtime, workday_counter, the overtime (in minutes) and worked days
+  accumulated for the current month.
+- booked_overtime, booked_workdays, the part of those already recorded in a
+  transaction, when a previous extraction ended in the current month.
+- wk_period, wk_period_full, the work periods of the last worked day."""
+
+    __slots__ = ('rows', 'offset', 'digest', 'fieldnames', 'cur_month', 'cur_year',
+                 'units_overtime', 'workday_counter', 'booked_overtime', 'booked_workdays',
+                 'wk_period', 'wk_period_full')
+
+    def __init__(self, **values):
+        self.rows = 0
+        self.offset = 0
+        self.digest = None
+        self.fieldnames = None
+        self.cur_month = 0
+        self.cur_year = 0
+        self.units_overtime = 0
+        self.workday_counter = 0
+        self.booked_overtime = 0
+        self.booked_workdays = 0
+        self.wk_period = None
+        self.wk_period_full = None
+
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def asDict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@contextlib.contextmanager
+def locked(filename):
+    """Return a context manager holding an exclusive lock on the checkpoint file.
+
+The lock is taken on a file named after the checkpoint file, with a .lock
+extension, as the checkpoint file itself is replaced when it is saved."""
+    if fcntl is None:
+        yield
+        return
+
+    with open(filename + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _loadSeries(filename):
+    try:
+        with open(filename) as checkpoint_file:
+            content = json.load(checkpoint_file)
+    except (OSError, ValueError):
+        return {}
+
+    if content.get('version') != VERSION:
+        return {}
+
+    return content['series']
+
+
+def load(filename, series):
+    """Return the ExtractionState of the series saved in the file, None if there is none."""
+    state = _loadSeries(filename).get(series)
+    return ExtractionState(**state) if state is not None else None
+
+
+def save(filename, series, state):
+    """Save the ExtractionState of the series in the file, with the ones of the other series."""
+    states = _loadSeries(filename)
+    states[series] = state.asDict()
+    writeJson(filename, {'version': VERSION, 'series': states})
+
+
+def digestFile(binary_file, offset):
+    """Return the digests of the first offset bytes and of the whole content of the file,
+and the size of the content.
+
+The file, opened in binary mode, is read once from its current position. The
+digest of the prefix is None if the file is shorter than offset."""
+    hasher = hashlib.sha256()
+    prefix_digest = None
+    remaining = offset
+    size = 0
+
+    while True:
+        if remaining == 0 and prefix_digest is None:
+            prefix_digest = hasher.hexdigest()
+        chunk = binary_file.read(min(remaining, CHUNK_SIZE) if remaining > 0 else CHUNK_SIZE)
+        if not chunk:
+            break
+        remaining -= len(chunk) if remaining > 0 else 0
+        size += len(chunk)
+        hasher.update(chunk)
+
+    return prefix_digest, hasher.hexdigest(), size
@@ -0,0 +1,219 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Columnar parsing backend for the Timesheet Report CSV files.
+
+The whole file is read at once and stored column by column in typed arrays:
+dates as ordinals, worked times as minutes and day types as small int codes.
+Every distinct value is parsed only once, then the classification of the
+rows and the monthly overtime are computed over the arrays."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import calendar
+import datetime
+import re
+from array import array
+from itertools import compress
+
+from importers.smals.rules import WORK, HALF_WORK, SKIP, UNKNOWN
+from utils import timeparse
+
+# Known day types, their code is their position in the tuple. Unknown
+# values found in a file get the next free codes.
+DAYTYPES = ('', '-', 'WK-PT', 'PRE', 'CAO', 'MAL', 'JFR', 'COLFE')
+
+NO_TIME = -1
+
+_day_regex = re.compile("[0-9]{1,2}")
+
+
+def parseMinutes(value):
+    """Return the number of minutes of a [H]H:MM string or NO_TIME if it is not one."""
+    try:
+        return timeparse.toMinutes(value)
+    except ValueError:
+        return NO_TIME
+
+
+class TimesheetColumns:
+    """The content of a timesheet file, stored column by column.
+
+Attributes:
+- size, the number of rows.
+- raw, the columns as read, per field name, kept to report faulty values.
+- dates, the dates of the rows as ordinals.
+- months, the index in periods of the month of each row.
+- periods, the distinct 'YYYY-MM' months, in order of appearance.
+- timespent, the TIMESPENT field in minutes, NO_TIME if not a time.
+- dtype, dtype2, dtype3, dtype4, the day types as codes of daytypes.
+- daytypes, the day types indexed by their code.
+- invalid, when lenient, the rows with an invalid field or unknown day types,
+  as (reason, row as a dict) by index of the row in the file.
+
+A ValueError is raised for the first invalid DATE, or by classify for the
+first invalid TIMESPENT of a worked day, unless lenient. The rows with an
+invalid DATE are then left out of the columns, as if they were not in the
+file, and classify gives no action to the ones with an invalid TIMESPENT or
+with unknown day types, not skipped."""
+
+    def __init__(self, reader, lenient=False):
+        header = next(reader, [])
+        width = len(header)
+
+        rows = [row for row in reader if row]
+        if rows and min(map(len, rows)) < width:
+            rows = [row + [None] * (width - len(row)) for row in rows]
+
+        self.lenient = lenient
+        self.invalid = {}
+        # The index in the file of each row, None while no row is left out.
+        self.indexes = None
+        self.__store(header, rows)
+
+        self.daytypes = list(DAYTYPES)
+        codes = {value: code for code, value in enumerate(self.daytypes)}
+
+        self.__read_dates(self.raw['DATE'])
+        if self.invalid:
+            for index, (reason, _) in list(self.invalid.items()):
+                self.invalid[index] = (reason, dict(zip(header, rows[index])))
+            kept = [index for index in range(len(rows)) if index not in self.invalid]
+            self.indexes = array('l', kept)
+            self.__store(header, [rows[index] for index in kept])
+            self.__read_dates(self.raw['DATE'])
+        self.timespent = self.__bulk_map(self.raw['TIMESPENT'], parseMinutes, 'l')
+        self.dtype = self.__encode(self.raw['DAYTYPE'], codes)
+        self.dtype2 = self.__encode(self.raw['DAYTYPE2'], codes)
+        self.dtype3 = self.__encode(self.raw['DAYTYPE3'], codes)
+        self.dtype4 = self.__encode(self.raw['DAYTYPE4'], codes)
+
+    def __store(self, header, rows):
+        self.size = len(rows)
+        self.raw = dict(zip(header, map(list, zip(*rows)))) if rows else {
+            name: [] for name in header}
+
+    def __reject(self, index, value):
+        """Raise the ValueError of the invalid date of the row, or record it if lenient."""
+        try:
+            timeparse.toDate(value)
+        except ValueError as error:
+            if not self.lenient:
+                raise
+            self.invalid.setdefault(index, ("invalid DATE: {}".format(error), None))
+
+    def fileIndex(self, index):
+        """Return the index in the file of the row at index."""
+        return index if self.indexes is None else self.indexes[index]
+
+    @staticmethod
+    def __bulk_map(values, function, typecode):
+        """Apply the function once per distinct value and return the results as an array."""
+        table = {value: function(value) for value in set(values)}
+        return array(typecode, map(table.__getitem__, values))
+
+    def __encode(self, values, codes):
+        """Return the codes of the values, registering the values not known yet."""
+        for value in set(values).difference(codes):
+            codes[value] = len(self.daytypes)
+            self.daytypes.append(value)
+
+        return array('H', map(codes.__getitem__, values))
+
+    def __read_dates(self, values):
+        """Fill the dates, months and periods from the DATE column.
+
+Nearly every date of a file is distinct, but there are only a few distinct
+months, so only the first day of each month is parsed and the ordinal of a
+row is computed from its day in the month."""
+        days, _, month_years = zip(*(value.partition('/') for value in values)) if values else ((), (), ())
+
+        # Months are numbered in order of appearance.
+        months = dict.fromkeys(month_years)
+        firsts = array('l')
+        lengths = array('l')
+        self.periods = []
+        for index, month_year in enumerate(months):
+            months[month_year] = index
+            try:
+                first = timeparse.toDate('1/' + month_year)
+            except ValueError:
+                # Let the parser report the faulty dates.
+                for row_index in [row_index for row_index, value in enumerate(month_years)
+                                  if value == month_year]:
+                    self.__reject(row_index, values[row_index])
+                firsts.append(0)
+                lengths.append(0)
+                self.periods.append(None)
+                continue
+            month, _, year = month_year.partition('/')
+            firsts.append(first.toordinal())
+            lengths.append(calendar.monthrange(first.year, first.month)[1])
+            self.periods.append("{}-{}".format(year, month))
+
+        day_numbers = {day: int(day) if _day_regex.fullmatch(day) else 0 for day in set(days)}
+
+        self.months = array('l', map(months.__getitem__, month_years))
+        day_in_month = array('l', map(day_numbers.__getitem__, days))
+        for index, (day, month) in enumerate(zip(day_in_month, self.months)):
+            if not 1 <= day <= lengths[month]:
+                self.__reject(index, values[index])
+
+        self.dates = array('l', (firsts[month] + day - 1 for day, month in zip(day_in_month, self.months)))
+
+    def date(self, index):
+        """Return the date of the row at index."""
+        return datetime.date.fromordinal(self.dates[index])
+
+    def classify(self, standard_work_period, rules):
+        """Return the action bits of each row, decided by the rules.DayTypeRules, and the
+totals of each month.
+
+The totals are a list of (first row, end row, overtime in minutes, worked
+days) tuples, one per run of consecutive rows of the same month, in file
+order. A ValueError is raised if a worked day has no valid TIMESPENT, unless
+lenient, see the class."""
+        width = len(self.daytypes).bit_length()
+        keys = array('Q', (a | (b << width) | (c << 2 * width) | (d << 3 * width)
+                           for a, b, c, d in zip(self.dtype, self.dtype2, self.dtype3, self.dtype4)))
+
+        names = self.daytypes
+        decisions = {}
+        for key in set(keys):
+            combination = tuple(names[(key >> (i * width)) & ((1 << width) - 1)] for i in range(4))
+            decisions[key] = rules.classify(combination)
+        actions = array('H', map(decisions.__getitem__, keys))
+
+        if self.lenient:
+            for index in [index for index, action in enumerate(actions)
+                          if action & UNKNOWN and not action & SKIP]:
+                self.__invalidate(actions, index, "unknown day types")
+
+        worked = array('B', (action & WORK == WORK for action in actions))
+        for index in compress(range(self.size), worked):
+            if self.timespent[index] == NO_TIME:
+                message = "Parameter was not a string  of the form [H]H:MM: {}".format(
+                    self.raw['TIMESPENT'][index])
+                if not self.lenient:
+                    raise ValueError(message)
+                self.__invalidate(actions, index, "invalid TIMESPENT: " + message)
+                worked[index] = 0
+
+        half_period = int(standard_work_period / 2)
+        due = array('l', (
+            (half_period if action & HALF_WORK else standard_work_period) if action & WORK else 0
+            for action in actions))
+        overtime = array('l', (spent - period if flag else 0
+                               for spent, period, flag in zip(self.timespent, due, worked)))
+
+        months = self.months
+        starts = [0] + [index for index in range(1, self.size) if months[index] != months[index - 1]]
+        ends = starts[1:] + [self.size]
+        totals = [(start, end, sum(overtime[start:end]), sum(worked[start:end]))
+                  for start, end in zip(starts, ends)] if self.size else []
+
+        return actions, totals
+
+    def __invalidate(self, actions, index, reason):
+        """Record the row at index as invalid, with no action."""
+        self.invalid[self.fileIndex(index)] = (
+            reason, {name: values[index] for name, values in self.raw.items()})
+        actions[index] = 0
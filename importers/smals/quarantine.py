@@ -0,0 +1,125 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Quarantine of the rows of a timesheet report that can not be processed.
+
+In lenient mode, the rows with an invalid DATE or TIMESPENT and the ones with
+an unknown combination of day types are not processed, they are written to a
+quarantine report instead, so the extraction of the other rows goes on. The
+quarantine report of smals-report-201812-cleaned.csv is
+smals-report-201812-cleaned_quarantine.csv, a report with the same columns and
+two more: LINE, the line of the row in the original report, and REASON, why
+it was quarantined.
+
+The quarantine reports are written in a directory of their own, see
+defaultDirectory, not next to the reports: their names and headers are the
+ones of a report, so the tools walking the download directory would extract
+them before they are corrected.
+
+The quarantine report is itself a timesheet report, once its rows are
+corrected, it is extracted like any other, giving the directives of these rows
+only, without extracting the original report again. The month totals it gives
+are then the part of the totals of these rows.
+
+A quarantine report is only written when the rows quarantined have changed, so
+the corrections made in an existing one are not lost by a new extraction of
+the original report, and never when the report extracted is itself a
+quarantine report."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import csv
+import os
+from os import path
+
+from utils import csvio
+
+SUFFIX = '_quarantine'
+EXTRA_FIELDS = ('LINE', 'REASON')
+
+DIALECT = csv.excel()
+DIALECT.delimiter = ';'
+
+
+def defaultDirectory():
+    """Return the directory of the quarantine reports, when the importer is given none.
+
+It is the SMALS_QUARANTINE_DIR environment variable if set, otherwise
+beancount-importers/smals-quarantine in the XDG data directory."""
+    directory = os.environ.get('SMALS_QUARANTINE_DIR')
+    if directory:
+        return directory
+
+    data_home = os.environ.get('XDG_DATA_HOME') or path.expanduser(path.join('~', '.local', 'share'))
+    return path.join(data_home, 'beancount-importers', 'smals-quarantine')
+
+
+def reportName(filename, directory=None):
+    """Return the name of the quarantine report of the report, in the directory if given."""
+    stem = path.splitext(path.basename(csvio.stripCompression(filename)))[0]
+    if not stem.endswith(SUFFIX):
+        stem += SUFFIX
+    return path.join(directory if directory is not None else path.dirname(filename), stem + '.csv')
+
+
+def isReport(filename):
+    """Check if the file is a quarantine report."""
+    return path.splitext(path.basename(csvio.stripCompression(filename)))[0].endswith(SUFFIX)
+
+
+def lineOf(index, row):
+    """Return the line of the row at index in the original report, as a string.
+
+The row of a quarantine report has the line of the original report. Otherwise
+it is the line following the header, assuming the rows are on a line each."""
+    line = row.get('LINE')
+    return line if line else str(index + 2)
+
+
+class Quarantine:
+    """The rows quarantined during the extraction of a report.
+
+Parameters:
+- filename, the name of the report extracted.
+- directory, the directory of the quarantine report, defaultDirectory() by
+  default."""
+
+    def __init__(self, filename, directory=None):
+        self.filename = filename
+        self.report = reportName(filename, directory if directory is not None else defaultDirectory())
+        # The row and the reason, by line of the row in the original report.
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, index, row, reason):
+        """Quarantine the row at index in the report, a dict of its fields."""
+        self.rows.setdefault(lineOf(index, row), (row, reason))
+
+    def __saved_lines(self):
+        """Return the lines of the rows of the existing quarantine report, None if there is none."""
+        try:
+            with csvio.openText(self.report) as report_file:
+                return {row.get('LINE') for row in csv.DictReader(report_file, dialect=DIALECT)}
+        except FileNotFoundError:
+            return None
+
+    def save(self):
+        """Write the quarantine report, with the fields of the rows, if needed.
+
+Return the name of the report written, None if it was not written."""
+        if not self.rows or isReport(self.filename) or self.__saved_lines() == set(self.rows):
+            return None
+
+        # The fields of the rows are the ones of the header of the report, in order.
+        first, _ = next(iter(self.rows.values()))
+        fieldnames = [name for name in first if name is not None and name not in EXTRA_FIELDS]
+        os.makedirs(path.dirname(self.report) or '.', exist_ok=True)
+        temporary = self.report + '.tmp'
+        with open(temporary, 'w', encoding=csvio.ENCODING, newline='') as report_file:
+            writer = csv.writer(report_file, dialect=DIALECT)
+            writer.writerow(fieldnames + list(EXTRA_FIELDS))
+            for line, (row, reason) in sorted(self.rows.items(), key=lambda item: (len(item[0]), item[0])):
+                writer.writerow([row.get(name) for name in fieldnames] + [line, reason])
+        os.replace(temporary, self.report)
+
+        return self.report
@@ -0,0 +1,152 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Classification of the rows of the Timesheet Reports by their day types.
+
+What is recorded for a row depends on the combination of its DAYTYPE,
+DAYTYPE2, DAYTYPE3 and DAYTYPE4 fields. The decisions are given by a table of
+rules, the first rule matching the combination gives the actions to take.
+Each distinct combination is decided once, then found in a dictionary.
+
+A rule is a dict with the day types to match, by field name, and the list of
+the names of its actions. A field missing from the rule matches any value, a
+list of values matches any of them:
+
+    {"DAYTYPE3": ["JFR", "COLFE"], "DAYTYPE4": "", "actions": ["skip"]}
+
+A combination matched by no rule is unknown, the row is ignored and reported."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import collections
+import json
+
+# Bits of the action computed for every row.
+SKIP = 0x01               # Week-end, day before the start or legal holiday
+WORK = 0x02               # Worked day, accounted as overtime and worked day
+HALF_WORK = 0x04          # Only half of the standard work period is due
+SICK_FULL = 0x08          # Whole day of sickness
+SICK_HALF = 0x10          # Half a day of sickness
+VACATION_FULL = 0x20      # Whole day of vacation
+VACATION_HALF = 0x40      # Half a day of vacation next to a worked half day
+VACATION_HALF_DT4 = 0x80  # Half a day of vacation given by DAYTYPE4
+UNKNOWN = 0x100           # Combination of day types not handled, row ignored
+
+ACTIONS = {
+    'skip': SKIP,
+    'work': WORK,
+    'half_work': HALF_WORK,
+    'sick_full': SICK_FULL,
+    'sick_half': SICK_HALF,
+    'vacation_full': VACATION_FULL,
+    'vacation_half': VACATION_HALF,
+    'vacation_half_dt4': VACATION_HALF_DT4,
+    'unknown': UNKNOWN,
+}
+
+FIELDS = ('DAYTYPE', 'DAYTYPE2', 'DAYTYPE3', 'DAYTYPE4')
+
+DEFAULT_RULES = (
+    # Week-end day or day before the start at the customer.
+    {'DAYTYPE': ['WK-PT', '-'], 'actions': ['skip']},
+    # Worked day, possibly half a day of vacation or sickness.
+    {'DAYTYPE2': 'PRE', 'DAYTYPE3': 'CAO', 'actions': ['work', 'half_work', 'vacation_half']},
+    {'DAYTYPE2': 'PRE', 'DAYTYPE3': 'MAL', 'actions': ['work', 'half_work', 'sick_half']},
+    {'DAYTYPE2': 'PRE', 'actions': ['work']},
+    # Legal holiday or day the customer is closed.
+    {'DAYTYPE3': ['JFR', 'COLFE'], 'DAYTYPE4': '', 'actions': ['skip']},
+    # Sickness, the whole day or half of it.
+    {'DAYTYPE3': 'MAL', 'DAYTYPE4': '', 'actions': ['sick_full']},
+    {'DAYTYPE3': 'MAL', 'DAYTYPE4': 'CAO', 'actions': ['sick_half', 'vacation_half_dt4']},
+    {'DAYTYPE3': 'MAL', 'actions': ['sick_half', 'unknown']},
+    # Vacation, the whole day or half of it.
+    {'DAYTYPE3': 'CAO', 'actions': ['vacation_full']},
+    {'DAYTYPE4': 'CAO', 'actions': ['vacation_half_dt4']},
+)
+
+
+class DayTypeRules:
+    """A compiled table of rules, deciding the action bits of the combinations of day types.
+
+A ValueError is raised if a rule has an unknown field or action."""
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = [self.__compile(rule) for rule in rules]
+        self.decisions = {}
+
+    @staticmethod
+    def __compile(rule):
+        unknown_fields = set(rule).difference(FIELDS + ('actions',))
+        if unknown_fields:
+            raise ValueError("Unknown fields in day type rule {}: {}".format(
+                rule, ", ".join(sorted(unknown_fields))))
+
+        patterns = []
+        for field in FIELDS:
+            values = rule.get(field)
+            if values is None:
+                patterns.append(None)
+            else:
+                patterns.append(frozenset([values] if isinstance(values, str) else values))
+
+        action = 0
+        for name in rule.get('actions', ()):
+            if name not in ACTIONS:
+                raise ValueError("Unknown action in day type rule {}: {}".format(rule, name))
+            action |= ACTIONS[name]
+
+        return tuple(patterns), action
+
+    def __decide(self, combination):
+        for patterns, action in self.rules:
+            if all(pattern is None or value in pattern
+                   for pattern, value in zip(patterns, combination)):
+                return action
+
+        return UNKNOWN
+
+    def classify(self, combination):
+        """Return the action bits of the (DAYTYPE, DAYTYPE2, DAYTYPE3, DAYTYPE4) tuple."""
+        action = self.decisions.get(combination)
+        if action is None:
+            action = self.decisions[combination] = self.__decide(combination)
+
+        return action
+
+
+def load(filename):
+    """Return the DayTypeRules of the JSON file, holding the list of the rules."""
+    with open(filename) as rules_file:
+        return DayTypeRules(json.load(rules_file))
+
+
+def toRules(rules):
+    """Return the DayTypeRules given as None for the default ones, a JSON file name, a list
+of rules or a DayTypeRules object."""
+    if rules is None:
+        return DayTypeRules()
+    if isinstance(rules, DayTypeRules):
+        return rules
+    if isinstance(rules, str):
+        return load(rules)
+
+    return DayTypeRules(rules)
+
+
+class UnknownDayTypes:
+    """The rows of a file with an unknown combination of day types, counted per combination."""
+
+    def __init__(self):
+        # The number of rows and the first row of each combination, in order of appearance.
+        self.combinations = collections.OrderedDict()
+
+    def add(self, combination, row):
+        entry = self.combinations.get(combination)
+        if entry is None:
+            self.combinations[combination] = [1, row]
+        else:
+            entry[0] += 1
+
+    def log(self, logger, filename):
+        """Log a warning per combination, with the number of rows ignored and the first one."""
+        for combination, (count, row) in self.combinations.items():
+            logger.warning("Unknown day types %s in %d row(s) of %s, rows ignored, the first one: %s",
+                           dict(zip(FIELDS, combination)), count, filename, row)
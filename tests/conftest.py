@@ -0,0 +1,13 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def outputFiles(tmp_path, monkeypatch):
+    """Write the logs and the quarantine reports of the importers in the temporary directory of the test."""
+    for name in ('SMALS', 'HETZNER'):
+        monkeypatch.setenv(name + '_LOG_FILE', str(tmp_path / '{}-importer.log'.format(name.lower())))
+    monkeypatch.setenv('SMALS_QUARANTINE_DIR', str(tmp_path / 'quarantine'))
@@ -0,0 +1,16 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Tests of the parsing backends of the smals importer."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+from benchmarks import check_backends
+from benchmarks import generate_timesheet
+
+
+def test_backends_extract_the_same_entries(tmp_path, monkeypatch):
+    # The log file of the importer is written in the current directory.
+    monkeypatch.chdir(tmp_path)
+    filename = generate_timesheet.defaultFileName(3000, str(tmp_path))
+    generate_timesheet.generate(filename, 3000)
+
+    assert list(check_backends.check(filename)) == []
@@ -0,0 +1,36 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Tests of the checks of the export file of the extracted transactions."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import importlib.util
+
+import pytest
+
+from utils import driver
+from utils import export
+
+
+@pytest.fixture
+def noPyarrow(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec',
+                        lambda name, *args: None if name == 'pyarrow' else find_spec(name, *args))
+
+
+def test_check_export(noPyarrow):
+    assert export.checkExport('entries.csv.gz') == 'csv'
+    with pytest.raises(ValueError):
+        export.checkExport('entries.xlsx')
+    with pytest.raises(OSError):
+        export.checkExport('entries.parquet')
+
+
+def test_driver_checks_the_export_first(noPyarrow, monkeypatch):
+    def run(*_):
+        raise AssertionError("The files are extracted")
+    monkeypatch.setattr(driver, 'run', run)
+
+    with pytest.raises(SystemExit) as exit_info:
+        driver.main(['exemple.import', 'input', '-x', 'entries.parquet'])
+    assert exit_info.value.code == 2
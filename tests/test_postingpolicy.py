@@ -0,0 +1,92 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Tests of the postings of the line items of an invoice, per posting policy."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+from decimal import Decimal
+
+import pytest
+
+from utils.postingpolicy import LineItem, PostingEngine
+from utils.utils import PostingPolicyEnum
+
+VAT = "Expenses:Taxes:VAT"
+
+ITEMS = (LineItem("Expenses:Hosting", Decimal("10.00"), 21),
+         LineItem("Expenses:Storage", Decimal("5.00"), 21),
+         LineItem("Expenses:Hosting", Decimal("2.50"), 21))
+
+
+def amounts(posting_policy, items=ITEMS, vat=None):
+    postings = PostingEngine(posting_policy, VAT).postings(items, "EUR", vat)
+    assert all(posting.units.currency == "EUR" for posting in postings)
+    return [(posting.account, posting.units.number) for posting in postings]
+
+
+def test_single():
+    assert amounts(PostingPolicyEnum.SINGLE) == [
+        ("Expenses:Hosting", Decimal("12.50")),
+        ("Expenses:Storage", Decimal("5.00")),
+        (VAT, Decimal("3.68")),
+    ]
+
+
+def test_multi():
+    assert amounts(PostingPolicyEnum.MULTI) == [
+        ("Expenses:Hosting", Decimal("10.00")),
+        ("Expenses:Storage", Decimal("5.00")),
+        ("Expenses:Hosting", Decimal("2.50")),
+        (VAT, Decimal("3.68")),
+    ]
+
+
+def test_no_vat():
+    assert amounts(PostingPolicyEnum.SINGLE_NO_VAT) == [
+        ("Expenses:Hosting", Decimal("12.50")),
+        ("Expenses:Storage", Decimal("5.00")),
+    ]
+    assert amounts(PostingPolicyEnum.MULTI_NO_VAT) == [
+        ("Expenses:Hosting", Decimal("10.00")),
+        ("Expenses:Storage", Decimal("5.00")),
+        ("Expenses:Hosting", Decimal("2.50")),
+    ]
+
+
+def test_include_vat():
+    assert amounts(PostingPolicyEnum.SINGLE_INCLUDE_VAT) == [
+        ("Expenses:Hosting", Decimal("15.13")),
+        ("Expenses:Storage", Decimal("6.05")),
+    ]
+
+
+def test_vat_of_the_invoice():
+    # The VAT given by the invoice is used instead of the computed one.
+    assert amounts(PostingPolicyEnum.SINGLE, vat=Decimal("3.67"))[-1] == (VAT, Decimal("3.67"))
+    assert sum(number for _, number in amounts(PostingPolicyEnum.SINGLE_INCLUDE_VAT,
+                                               vat=Decimal("3.67"))) == Decimal("21.17")
+
+
+@pytest.mark.parametrize("nets, total", [
+    # Net amounts below the cent, the total is rounded to the cent.
+    (("0.123", "0.456"), Decimal("0.70")),
+    (("0.005", "0.005", "0.005"), Decimal("0.02")),
+    (("33.33", "33.33", "33.34"), Decimal("121.00")),
+    (("-1.234", "5.678"), Decimal("5.37")),
+])
+def test_include_vat_sums_to_the_total(nets, total):
+    items = [LineItem("Expenses:Account{}".format(index), Decimal(net), 21)
+             for index, net in enumerate(nets)]
+    postings = amounts(PostingPolicyEnum.SINGLE_INCLUDE_VAT, items)
+    assert all(number == number.quantize(Decimal("0.01")) for _, number in postings)
+    assert sum(number for _, number in postings) == total
+
+
+def test_include_vat_is_stable():
+    items = [LineItem("Expenses:A", Decimal("0.01"), 21), LineItem("Expenses:B", Decimal("0.01"), 21)]
+    assert amounts(PostingPolicyEnum.SINGLE_INCLUDE_VAT, items) == \
+        amounts(PostingPolicyEnum.SINGLE_INCLUDE_VAT, items)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        PostingEngine("SINGLE", VAT)
@@ -0,0 +1,87 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Tests of the quarantine of the rows of the smals reports."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import csv
+import os
+
+from beancount.ingest import cache
+
+from benchmarks import bench_smals
+from benchmarks import generate_timesheet
+from importers.smals import aggregates
+from importers.smals import quarantine
+
+ROWS = 400
+
+
+def months(index_file):
+    with aggregates.AggregateIndex(index_file) as index:
+        return index.months()
+
+
+def corrupt(report):
+    """Replace the TIMESPENT of some worked days by an invalid one, return the original values by line."""
+    with open(report) as report_file:
+        lines = report_file.read().splitlines(True)
+
+    original = {}
+    for number in range(2, len(lines) + 1, 37):
+        fields = lines[number - 1].split(';')
+        if fields[3] == 'PRE':
+            original[str(number)] = fields[4]
+            fields[4] = '7h47'
+            lines[number - 1] = ';'.join(fields)
+
+    with open(report, 'w') as report_file:
+        report_file.writelines(lines)
+    return original
+
+
+def correct(report, original):
+    """Restore the TIMESPENT of the rows of the quarantine report."""
+    with open(report, newline='') as report_file:
+        rows = list(csv.reader(report_file, dialect=quarantine.DIALECT))
+    header = rows[0]
+    for row in rows[1:]:
+        row[header.index('TIMESPENT')] = original[row[header.index('LINE')]]
+
+    with open(report, 'w', newline='') as report_file:
+        csv.writer(report_file, dialect=quarantine.DIALECT).writerows(rows)
+
+
+def test_corrected_quarantine_report_adds_to_the_month_totals(tmp_path):
+    directory = tmp_path / 'downloads'
+    directory.mkdir()
+    report = generate_timesheet.defaultFileName(ROWS, str(directory))
+    generate_timesheet.generate(report, ROWS)
+
+    expected = str(tmp_path / 'expected.sqlite')
+    bench_smals.makeImporter("rows", aggregate_index=expected).extract(cache._FileMemo(report))
+
+    original = corrupt(report)
+    assert original
+    index = str(tmp_path / 'index.sqlite')
+    bench_smals.makeImporter("rows", aggregate_index=index, errors="quarantine",
+                             quarantine_dir=str(tmp_path)).extract(cache._FileMemo(report))
+    assert months(index) != months(expected)
+
+    quarantine_report = quarantine.reportName(report, str(tmp_path))
+    correct(quarantine_report, original)
+    bench_smals.makeImporter("rows", aggregate_index=index).extract(cache._FileMemo(quarantine_report))
+
+    assert months(index) == months(expected)
+
+
+def test_quarantine_report_is_not_written_with_the_downloads(tmp_path):
+    directory = tmp_path / 'downloads'
+    directory.mkdir()
+    report = generate_timesheet.defaultFileName(ROWS, str(directory))
+    generate_timesheet.generate(report, ROWS)
+    corrupt(report)
+
+    bench_smals.makeImporter("rows", errors="quarantine").extract(cache._FileMemo(report))
+
+    assert os.listdir(str(directory)) == [os.path.basename(report)]
+    assert os.path.exists(quarantine.reportName(report, str(tmp_path / 'quarantine')))
@@ -0,0 +1,61 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Tests of the lazy registry of the importers and of exemple.import."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import check_config
+from importers.registry import Registry, deferred
+from utils.utils import PostingPolicyEnum
+
+
+class File:
+    def __init__(self, name):
+        self.name = name
+
+
+def test_deferred_needs_a_named_function():
+    with pytest.raises(ValueError):
+        deferred(dict)
+
+
+def test_deferred_is_built_with_the_importer():
+    registry = Registry()
+    lazy = registry.register("importers.hetzner:Importer", None, "Liabilities:Hetzner", "Assets:Bank",
+                             deferred("importers.hetzner.policy:makePolicy",
+                                      posting_policy=PostingPolicyEnum.MULTI))
+    importers = pickle.loads(pickle.dumps(registry.config()))
+    assert not lazy.isBuilt() and not importers[0].isBuilt()
+
+    assert importers[0].importer().policy.posting_policy is PostingPolicyEnum.MULTI
+
+
+def test_invalid_importer_is_not_built_again():
+    registry = Registry()
+    registry.register("importers.hetzner:Importer", None, "Liabilities:Hetzner", "Assets:Bank",
+                      deferred("importers.hetzner.policy:makePolicy", posting_policy="SINGLE"))
+    lazy, = registry.config()
+
+    with pytest.raises(ValueError):
+        lazy.identify(File("/tmp/R0008012345.pdf"))
+    assert not lazy.identify(File("/tmp/R0008012346.pdf"))
+    with pytest.raises(ValueError):
+        lazy.importer()
+
+
+def test_example_loads_no_importer():
+    code = ("import runpy, sys; runpy.run_path('exemple.import'); "
+            "print(sorted(name for name in sys.modules if name.startswith('importers.')))")
+    modules = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True,
+                             universal_newlines=True).stdout
+    assert 'importers.hetzner' not in modules and 'importers.smals' not in modules
+
+
+def test_example_runs_as_a_list(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert list(check_config.check(paths=['input'])) == []
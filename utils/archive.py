@@ -0,0 +1,307 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Archiving of the downloaded files in the documents tree, in bulk.
+
+This is the equivalent of bean-file, where the destinations of all the files
+are planned at once, with the file_account, file_date and file_name methods
+of the importers and the naming of bean-file, before any file is placed. A
+destination is compared to the files to archive there and to the file already
+archived there, first by inode and size, then by a digest of the content:
+
+- new, the file is placed at its destination.
+- archived, the same content is already at the destination, the file is left
+  where it is.
+- duplicate, the same content is archived from another file of the run, the
+  file is left where it is.
+- collision, another content is at the destination, or is archived there
+  from another file of the run. Nothing is placed if there is a collision,
+  unless the destination is overwritten for a single file.
+
+The digests are computed by a pool of threads, only for the files of the same
+size, and kept in a state file of the documents tree with the size and
+modification time of the files, so archiving again a directory mostly
+archived reads almost no content. Usage:
+
+    python -m utils.archive exemple.import downloads/ -o documents/ [-n] [-k] [-j JOBS] [--overwrite]
+
+The files are moved by a rename, or kept and hard linked with --keep, when the
+documents tree is on the same file system, and copied otherwise."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import collections
+import concurrent.futures
+import errno
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+from beancount.ingest import cache
+from beancount.ingest import file as file_module
+from beancount.utils import file_utils
+
+from utils.contentcache import ContentCache
+from utils.driver import loadConfig
+from utils.utils import writeJson
+
+NEW = 'new'
+ARCHIVED = 'archived'
+DUPLICATE = 'duplicate'
+COLLISION = 'collision'
+
+# The file of the digests of the files, in the documents tree.
+STATE_FILE = '.archive-digests.json'
+
+Job = collections.namedtuple('Job', 'source destination status')
+
+
+def _identify(importers, filename):
+    """Return the importers identifying the file."""
+    file = cache.get_file(filename)
+    matching = []
+    for importer in importers:
+        try:
+            if importer.identify(file):
+                matching.append(importer)
+        except Exception as exc:
+            logging.exception("Importer %s.identify() raised an unexpected error: %s",
+                              importer.name(), exc)
+
+    return matching
+
+
+def destinations(importers, files_or_directories, documents):
+    """Return the (file name, destination) pairs of the files identified, as bean-file names them."""
+    # The cache of beancount only accepts absolute file names.
+    filenames = sorted(os.path.abspath(filename)
+                       for filename in file_utils.find_files(files_or_directories))
+
+    pairs = []
+    for filename in filenames:
+        matching = _identify(importers, filename)
+        if not matching:
+            continue
+        destination = file_module.file_one_file(filename, matching, documents, idify=True)
+        if destination is not None:
+            pairs.append((filename, destination))
+
+    return pairs
+
+
+def _stat(filename):
+    try:
+        return os.stat(filename)
+    except FileNotFoundError:
+        return None
+
+
+class Planner:
+    """The comparison of the files to archive and of the files already archived.
+
+Parameters:
+- digests, a utils.contentcache.ContentCache giving the digests of the files.
+- jobs, the number of threads computing the digests, the number of CPUs by
+  default.
+- overwrite, if true, the file archived at the destination of a single file
+  with another content is replaced."""
+
+    def __init__(self, digests=None, jobs=None, overwrite=False):
+        self.digests = digests if digests is not None else ContentCache()
+        self.jobs = jobs or os.cpu_count() or 1
+        self.overwrite = overwrite
+        self.stats = {}
+
+    def __same(self, first, second):
+        """Check if the two files have the same content, from their stat and digest."""
+        first_stat, second_stat = self.stats[first], self.stats[second]
+        if (first_stat.st_dev, first_stat.st_ino) == (second_stat.st_dev, second_stat.st_ino):
+            return True
+        if first_stat.st_size != second_stat.st_size:
+            return False
+        return self.digests.digest(first) == self.digests.digest(second)
+
+    def __hash(self, comparisons):
+        """Compute at once, in parallel, the digests needed by the comparisons."""
+        filenames = set()
+        for first, second in comparisons:
+            first_stat, second_stat = self.stats[first], self.stats[second]
+            if (first_stat.st_dev, first_stat.st_ino) != (second_stat.st_dev, second_stat.st_ino) \
+               and first_stat.st_size == second_stat.st_size:
+                filenames.update((first, second))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            # The hashing functions release the GIL on large buffers.
+            list(pool.map(self.digests.digest, sorted(filenames)))
+
+    def plan(self, pairs):
+        """Return the Job of each (file name, destination) pair, in the same order."""
+        groups = collections.OrderedDict()
+        for source, destination in pairs:
+            groups.setdefault(destination, []).append(source)
+
+        # The content a file is compared to: the one archived, or the first file to archive.
+        references = {}
+        comparisons = []
+        for destination, sources in groups.items():
+            for source in sources:
+                self.stats[source] = os.stat(source)
+            stat = _stat(destination)
+            if stat is not None:
+                self.stats[destination] = stat
+                references[destination] = destination
+            else:
+                references[destination] = sources[0]
+            comparisons.extend((source, references[destination]) for source in sources
+                               if source != references[destination])
+
+        self.__hash(comparisons)
+
+        statuses = {}
+        for destination, sources in groups.items():
+            reference = references[destination]
+            for source in sources:
+                if source == reference != destination:
+                    status = NEW
+                elif self.__same(source, reference):
+                    status = ARCHIVED if reference == destination else DUPLICATE
+                elif reference == destination and self.overwrite and len(sources) == 1:
+                    status = NEW
+                else:
+                    status = COLLISION
+                statuses[source, destination] = status
+
+        return [Job(source, destination, statuses[source, destination]) for source, destination in pairs]
+
+
+def _temporary(destination):
+    """Return the name of a new empty file of the directory of the destination."""
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(destination),
+                                         prefix='.' + os.path.basename(destination) + '-')
+    os.close(handle)
+    return temporary
+
+
+def _copy(source, destination):
+    """Copy the file, through a temporary file replacing the destination at once."""
+    temporary = _temporary(destination)
+    try:
+        # copyfile uses the zero-copy system calls when they are available.
+        shutil.copyfile(source, temporary)
+        shutil.copystat(source, temporary)
+        os.replace(temporary, destination)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def place(source, destination, keep=False):
+    """Place the file at its destination, return how: "renamed", "linked" or "copied".
+
+The file is renamed, or hard linked if keep is true, when the destination is
+on the same file system, copied otherwise, and then removed if keep is false.
+The destination is replaced at once, never seen partially written."""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    try:
+        if not keep:
+            os.rename(source, destination)
+            return "renamed"
+
+        temporary = _temporary(destination)
+        os.unlink(temporary)
+        os.link(source, temporary)
+        try:
+            os.replace(temporary, destination)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return "linked"
+    except OSError as error:
+        # Across devices, or on a file system without hard links.
+        if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+
+    _copy(source, destination)
+    if not keep:
+        os.remove(source)
+    return "copied"
+
+
+def loadDigests(documents):
+    """Return a ContentCache with the digests saved in the documents tree."""
+    digests = ContentCache()
+    try:
+        with open(os.path.join(documents, STATE_FILE)) as state_file:
+            content = json.load(state_file)
+        digests.digests = {filename: (tuple(key), digest) for filename, (key, digest) in content.items()}
+    except (OSError, ValueError):
+        pass
+
+    return digests
+
+
+def saveDigests(documents, digests):
+    """Save the digests of the files that still exist in the documents tree."""
+    writeJson(os.path.join(documents, STATE_FILE),
+              {filename: known for filename, known in digests.digests.items()
+               if os.path.exists(filename)})
+
+
+def _carryDigest(digests, source, destination):
+    """Record the digest of the source as the one of its copy or link at the destination."""
+    known = digests.digests.get(os.path.abspath(source))
+    if known is not None:
+        stat = os.stat(destination)
+        if (stat.st_size, stat.st_mtime_ns) == known[0]:
+            digests.digests[os.path.abspath(destination)] = known
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive the downloaded files in the documents tree")
+    parser.add_argument('config', help="Importers configuration file, defining CONFIG")
+    parser.add_argument('paths', nargs='+', help="Files or directories to archive")
+    parser.add_argument('-o', '--output', dest='documents', required=True,
+                        help="Root of the documents tree")
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help="Only print the plan, nothing is placed")
+    parser.add_argument('-k', '--keep', action='store_true',
+                        help="Keep the downloaded files, archived as hard links when possible")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of threads computing the digests, the number of CPUs by default")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="Replace an archived file having another content than the file to archive")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.documents):
+        parser.error("Documents directory does not exist: {}".format(args.documents))
+
+    digests = loadDigests(args.documents)
+    planner = Planner(digests, args.jobs, args.overwrite)
+    jobs = planner.plan(destinations(loadConfig(args.config), args.paths, args.documents))
+
+    counts = collections.Counter(job.status for job in jobs)
+    for job in jobs:
+        if job.status != ARCHIVED:
+            print("{:10} {} -> {}".format(job.status, job.source, job.destination))
+
+    if counts[COLLISION]:
+        print("Collisions, no file archived.", file=sys.stderr)
+    elif not args.dry_run:
+        for job in jobs:
+            if job.status == NEW:
+                place(job.source, job.destination, args.keep)
+                _carryDigest(digests, job.source, job.destination)
+
+    if not args.dry_run:
+        saveDigests(args.documents, digests)
+    print("{} new, {} already archived, {} duplicates, {} collisions".format(
+        counts[NEW], counts[ARCHIVED], counts[DUPLICATE], counts[COLLISION]))
+
+    return 1 if counts[COLLISION] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""A cache of the values computed from the content of files, like the text of a PDF file.
+
+The values are keyed on a digest of the content of the file, not on its
+name, so a file renamed, moved into the documents archive or downloaded twice
+is never converted again. The values of a file are stored in a JSON file of
+the cache directory, named after the digest:
+
+    <directory>/<first two digits of the digest>/<digest>.json
+
+Without a directory, the values are only kept in memory, for the run.
+
+The digest of a file is kept in memory with its size and modification time,
+so a file is read once per run to be hashed."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import hashlib
+import json
+import os
+
+from utils.utils import writeJson
+
+BUFFER_SIZE = 1 << 20
+
+
+def fileDigest(filename, buffer_size=BUFFER_SIZE):
+    """Return the hexadecimal blake2b digest of the content of the file."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb', buffering=0) as input_file:
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            size = input_file.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """The values computed from the content of files, by digest and key.
+
+Parameters:
+- directory, where the values are stored, None to only keep them in memory.
+
+The values must be serializable as JSON. The hits and misses attributes count
+the values found in the cache and the ones computed."""
+
+    VERSION = 1
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        # The digests by file name, with the size and modification time hashed.
+        self.digests = {}
+        # The values of the files already read or computed, by digest.
+        self.records = {}
+
+    def __getstate__(self):
+        # A copy sent to another process reads the values from the directory.
+        state = self.__dict__.copy()
+        state['digests'] = {}
+        state['records'] = {}
+        return state
+
+    def digest(self, filename):
+        """Return the digest of the content of the file, an OSError is raised if it can not be read."""
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        known = self.digests.get(filename)
+        if known is not None and known[0] == (stat.st_size, stat.st_mtime_ns):
+            return known[1]
+
+        digest = fileDigest(filename)
+        self.digests[filename] = ((stat.st_size, stat.st_mtime_ns), digest)
+        return digest
+
+    def __path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.json')
+
+    def __record(self, digest):
+        record = self.records.get(digest)
+        if record is not None:
+            return record
+
+        record = {}
+        if self.directory is not None:
+            try:
+                with open(self.__path(digest)) as record_file:
+                    content = json.load(record_file)
+                if content.get('version') == self.VERSION:
+                    record = content['values']
+            except (OSError, ValueError, KeyError):
+                pass
+
+        self.records[digest] = record
+        return record
+
+    def get(self, filename, key, compute):
+        """Return the value of the key for the content of the file.
+
+If it is not in the cache, the value is compute(filename), which is stored
+in the cache before being returned."""
+        digest = self.digest(filename)
+        record = self.__record(digest)
+        if key in record:
+            self.hits += 1
+            return record[key]
+
+        self.misses += 1
+        value = record[key] = compute(filename)
+
+        if self.directory is not None:
+            path = self.__path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writeJson(path, {'version': self.VERSION, 'values': record})
+
+        return value
@@ -0,0 +1,100 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Opening of the input files of the importers, compressed or not.
+
+The files are read through a large buffer and the files whose name ends with
+.gz, .xz or .zst are decompressed while they are read, so the reports can be
+kept compressed. The .zst files need the zstandard package.
+
+The returned files must be closed, preferably with a with statement."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import gzip
+import io
+import lzma
+from os import path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BUFFER_SIZE = 1 << 20
+ENCODING = 'utf-8'
+COMPRESSIONS = ('.gz', '.xz', '.zst')
+
+# The errors raised when a file is not readable or its content not decodable.
+READ_ERRORS = (OSError, EOFError, ValueError, lzma.LZMAError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def compression(filename):
+    """Return the extension of the compression of the file, None if it is not compressed."""
+    extension = path.splitext(filename)[1]
+    return extension if extension in COMPRESSIONS else None
+
+
+def stripCompression(filename):
+    """Return the file name without the extension of its compression."""
+    return filename[:-len(compression(filename))] if compression(filename) else filename
+
+
+def _openZstd(filename, buffer_size):
+    if zstandard is None:
+        raise OSError("The zstandard package is needed to read {}".format(filename))
+    return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb', buffering=buffer_size),
+                                                      closefd=True)
+
+
+def openBinary(filename, offset=0, buffer_size=BUFFER_SIZE):
+    """Return the content of the file, decompressed, as a binary file positioned at offset."""
+    extension = compression(filename)
+    if extension is None:
+        binary_file = open(filename, 'rb', buffering=buffer_size)
+    elif extension == '.gz':
+        binary_file = io.BufferedReader(gzip.open(filename, 'rb'), buffer_size)
+    elif extension == '.xz':
+        binary_file = io.BufferedReader(lzma.open(filename, 'rb'), buffer_size)
+    else:
+        binary_file = io.BufferedReader(_openZstd(filename, buffer_size), buffer_size)
+
+    try:
+        skip(binary_file, offset)
+    except BaseException:
+        binary_file.close()
+        raise
+
+    return binary_file
+
+
+def openText(filename, offset=0, encoding=ENCODING, buffer_size=BUFFER_SIZE):
+    """Return the content of the file, decompressed and decoded, positioned at the byte offset.
+
+The lines are not translated, as expected by the csv module."""
+    return io.TextIOWrapper(openBinary(filename, offset, buffer_size), encoding=encoding, newline='')
+
+
+def skip(binary_file, count):
+    """Move forward of count bytes from the current position of the binary file."""
+    if binary_file.seekable():
+        binary_file.seek(count, io.SEEK_CUR)
+        return
+
+    while count > 0:
+        chunk = binary_file.read(min(count, BUFFER_SIZE))
+        if not chunk:
+            break
+        count -= len(chunk)
+
+
+def readHeader(filename, encoding=ENCODING):
+    """Return the first line of the file, without its end of line.
+
+It is meant to be used with the convert method of the beancount file
+objects, which keeps it for all the importers. An empty string is returned
+if the file can not be read."""
+    try:
+        with openText(filename, encoding=encoding, buffer_size=io.DEFAULT_BUFFER_SIZE) as text_file:
+            return text_file.readline().rstrip('\r\n')
+    except READ_ERRORS:
+        return ''
@@ -0,0 +1,145 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Detection of the extracted transactions already recorded in the ledger, with a hash index.
+
+A transaction is identified by its date, the set of its accounts, the units
+of its postings and its worked_period metadata, if any. The digests of these
+keys for the transactions of the ledger are kept in a set, so finding
+whether an extracted transaction is a duplicate costs a single lookup,
+whatever the size of the ledger.
+
+The index can be saved in a JSON file, with the size and modification time
+of the files of the ledger. It is used instead of loading the ledger again,
+as long as none of them changes."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import hashlib
+import json
+import os
+
+from beancount import loader
+from beancount.core import amount
+from beancount.core import data
+from beancount.ingest import extract
+
+from utils.utils import writeJson
+
+META_KEYS = ('worked_period',)
+
+
+def entryKey(entry, meta_keys=META_KEYS):
+    """Return the digest identifying the transaction, None for other entries."""
+    if not isinstance(entry, data.Transaction):
+        return None
+
+    accounts = sorted({posting.account for posting in entry.postings})
+    units = sorted("{} {}".format(posting.units.number.normalize(), posting.units.currency)
+                   for posting in entry.postings
+                   if isinstance(posting.units, amount.Amount) and posting.units.number is not None)
+    meta = entry.meta or {}
+    key = "|".join([entry.date.isoformat(), ",".join(accounts), ",".join(units)] +
+                   [str(meta.get(name, '')) for name in meta_keys])
+
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+class DuplicateIndex:
+    """The set of the keys of the transactions of a ledger.
+
+Attributes:
+- keys, the set of the digests of the transactions.
+- files, the size and modification time of the files of the ledger, by name,
+  when the index was built from it."""
+
+    VERSION = 1
+
+    def __init__(self, entries=(), meta_keys=META_KEYS):
+        self.meta_keys = tuple(meta_keys)
+        self.keys = set()
+        self.files = {}
+        self.update(entries)
+
+    def update(self, entries):
+        """Add the transactions of the entries to the index."""
+        for entry in entries:
+            key = entryKey(entry, self.meta_keys)
+            if key is not None:
+                self.keys.add(key)
+
+    def isDuplicate(self, entry):
+        key = entryKey(entry, self.meta_keys)
+        return key is not None and key in self.keys
+
+    def mark(self, entries, drop=False):
+        """Return the entries, with the duplicates marked as beancount does, or dropped if drop."""
+        result = []
+        for entry in entries:
+            if self.isDuplicate(entry):
+                if drop:
+                    continue
+                meta = entry.meta.copy()
+                meta[extract.DUPLICATE_META] = True
+                entry = entry._replace(meta=meta)
+            result.append(entry)
+
+        return result
+
+    def save(self, filename):
+        writeJson(filename, {'version': self.VERSION,
+                             'meta_keys': list(self.meta_keys),
+                             'files': self.files,
+                             'keys': sorted(key.hex() for key in self.keys)})
+
+    @classmethod
+    def load(cls, filename):
+        """Return the index saved in the file, None if there is none or it can not be read."""
+        try:
+            with open(filename) as index_file:
+                content = json.load(index_file)
+            if content.get('version') != cls.VERSION:
+                return None
+            index = cls(meta_keys=content['meta_keys'])
+            index.files = content['files']
+            index.keys = {bytes.fromhex(key) for key in content['keys']}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return index
+
+    def isUpToDate(self):
+        """Check if the files of the ledger the index was built from are unchanged."""
+        return bool(self.files) and all(_stat(filename) == stat
+                                        for filename, stat in self.files.items())
+
+    @classmethod
+    def fromLedger(cls, ledger_filename, index_filename=None, meta_keys=META_KEYS):
+        """Return the index of the transactions of the ledger.
+
+If index_filename is given, the index saved in it is used if the files of the
+ledger have not changed, otherwise the ledger is loaded and the new index
+saved in it."""
+        if index_filename is not None:
+            index = cls.load(index_filename)
+            if (index is not None and index.meta_keys == tuple(meta_keys)
+                    and os.path.abspath(ledger_filename) in index.files and index.isUpToDate()):
+                return index
+
+        entries, _, options_map = loader.load_file(ledger_filename)
+        index = cls(entries, meta_keys)
+        for filename in [ledger_filename] + options_map.get('include', []):
+            stat = _stat(filename)
+            if stat is not None:
+                index.files[os.path.abspath(filename)] = stat
+
+        if index_filename is not None:
+            index.save(index_filename)
+
+        return index
+
+
+def _stat(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
@@ -0,0 +1,186 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Run the importers of a configuration over many files with a pool of processes.
+
+This is the equivalent of bean-extract, where the files are identified and
+extracted in parallel. Usage:
+
+    python -m utils.driver exemple.import downloads/ [-j JOBS] [-e LEDGER] [-o OUTPUT] [-i INDEX] [-m METRICS]
+        [-x EXPORT]
+
+The worker processes are started with the 'spawn' method and build their own
+importers, so no logger, file handler or thread of the main process is shared
+with them."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import runpy
+import sys
+
+from beancount import loader
+from beancount.ingest import cache
+from beancount.ingest import extract
+from beancount.ingest import identify
+from beancount.utils import file_utils
+
+from utils import dedup
+from utils import export
+from utils import instrument
+from utils import serialize
+
+# The importers of a worker process and their recorder, if instrumented, set by _initWorker.
+_importers = None
+_recorder = None
+
+
+def loadConfig(filename):
+    """Return the CONFIG list of importers declared in the configuration file."""
+    return runpy.run_path(filename)['CONFIG']
+
+
+def _initWorker(config, instrumented=False):
+    """Build the importers of a worker process from the configuration file name or list."""
+    global _importers, _recorder
+    _importers = loadConfig(config) if isinstance(config, str) else config
+    if instrumented:
+        _recorder = instrument.Recorder()
+        _importers = instrument.instrument(_importers, recorder=_recorder)
+
+
+def _processFile(filename):
+    """Identify and extract a file with the importers of the worker.
+
+Return a list of (file date, file name, importer name, entries) tuples, one
+per importer that identified the file, and the records of the calls of the
+importers if they are instrumented."""
+    file = cache.get_file(filename)
+    results = []
+
+    for importer in _importers:
+        try:
+            if not importer.identify(file):
+                continue
+            file_date = importer.file_date(file)
+            entries = extract.extract_from_file(filename, importer)
+        except Exception as exc:
+            logging.exception("Importer %s raised an unexpected error on %s: %s",
+                              importer.name(), filename, exc)
+            continue
+
+        results.append((file_date, filename, importer.name(), entries))
+
+    records = []
+    if _recorder is not None:
+        records, _recorder.records = _recorder.records, []
+
+    return results, records
+
+
+def sortKey(result):
+    """Order the results by file date, then by file name. Results without date come last."""
+    file_date, filename = result[0], result[1]
+    return (file_date is None, str(file_date), filename)
+
+
+def run(config, files_or_directories, jobs=None, recorder=None):
+    """Identify and extract all the files found, with a pool of jobs processes.
+
+Parameters:
+- config, the name of a configuration file or a list of importers. The
+  importers of the list are pickled to be sent to the worker processes.
+- files_or_directories, the files, and directories to walk, to process.
+- jobs, the number of processes, the number of CPUs by default.
+- recorder, a utils.instrument.Recorder, if given the calls of the importers
+  of the workers are recorded in it.
+
+Return a list of (file date, file name, importer name, entries) tuples,
+ordered by file date and file name, whatever the order the processes finish."""
+    # The cache of beancount only accepts absolute file names.
+    filenames = sorted(os.path.abspath(filename)
+                       for filename in file_utils.find_files(files_or_directories))
+    if not filenames:
+        return []
+
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(filenames) // (4 * jobs))
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_initWorker,
+                                                initargs=(config, recorder is not None)) as pool:
+        for file_results, records in pool.map(_processFile, filenames, chunksize=chunksize):
+            results.extend(file_results)
+            if recorder is not None:
+                recorder.records.extend(records)
+
+    results.sort(key=sortKey)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract transactions from downloads in parallel")
+    parser.add_argument('config', help="Importers configuration file, defining CONFIG")
+    parser.add_argument('paths', nargs='+', help="Files or directories to process")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of processes, the number of CPUs by default")
+    parser.add_argument('-e', '--existing', metavar='LEDGER',
+                        help="Existing ledger, to mark the duplicate entries")
+    parser.add_argument('-o', '--output', type=argparse.FileType('w'), default=sys.stdout,
+                        help="Output file, the standard output by default")
+    parser.add_argument('-i', '--index', metavar='FILE',
+                        help="With --existing, find the duplicates with a hash index of the ledger "
+                        "saved in the file, rather than by similarity")
+    parser.add_argument('-m', '--metrics', metavar='FILE',
+                        help="Record the time spent in the importers in the file, "
+                        "in the Prometheus format if its name ends with .prom, as JSON otherwise")
+    parser.add_argument('-x', '--export', metavar='FILE',
+                        help="Export the postings of the extracted transactions to the file, "
+                        "as CSV, Parquet or Arrow, according to its extension (see utils.export)")
+    args = parser.parse_args(argv)
+    if args.export:
+        try:
+            export.checkExport(args.export)
+        except (ValueError, OSError) as error:
+            parser.error(str(error))
+
+    # The configuration is also loaded here, as it may set extract.HEADER.
+    loadConfig(args.config)
+
+    existing_entries = None
+    index = None
+    if args.existing and args.index:
+        index = dedup.DuplicateIndex.fromLedger(args.existing, args.index)
+    elif args.existing:
+        existing_entries, _, _ = loader.load_file(args.existing)
+
+    recorder = instrument.Recorder() if args.metrics else None
+    results = run(args.config, args.paths, args.jobs, recorder)
+    if recorder is not None:
+        recorder.save(args.metrics)
+
+    new_entries_list = [(filename, entries) for _, filename, _, entries in results]
+    if index is not None:
+        new_entries_list = [(filename, index.mark(entries)) for filename, entries in new_entries_list]
+    else:
+        new_entries_list = extract.find_duplicate_entries(new_entries_list, existing_entries)
+
+    args.output.write(extract.HEADER)
+    for filename, entries in new_entries_list:
+        args.output.write(identify.SECTION.format(filename))
+        args.output.write('\n')
+        serialize.printExtractedEntries(entries, args.output)
+
+    if args.export:
+        try:
+            export.export((entry for _, entries in new_entries_list for entry in entries), args.export)
+        except OSError as error:
+            parser.exit(1, "{}: error: {}\n".format(parser.prog, error))
+
+
+if __name__ == '__main__':
+    main()
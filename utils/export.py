@@ -0,0 +1,137 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Export of the extracted transactions in a columnar format, for the analytics tools.
+
+The transactions are flattened to one row per posting, with the columns of
+COLUMNS. The rows are written as CSV, or with the pyarrow package, when it is
+installed, as a Parquet file or an Arrow IPC (Feather) file. The format is
+given by the extension of the file name:
+
+    .csv, .csv.gz, .csv.xz    CSV, compressed or not
+    .parquet                  Parquet
+    .arrow, .feather          Arrow IPC
+
+The entries that are not transactions are not exported."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import csv
+import gzip
+import importlib
+import importlib.util
+import json
+import lzma
+from os import path
+
+from beancount.core import data
+from beancount.ingest import extract
+
+COLUMNS = ('date', 'flag', 'payee', 'narration', 'account', 'posting_flag', 'number', 'currency',
+           'price_number', 'price_currency', 'worked_period', 'duplicate', 'filename', 'lineno',
+           'metadata')
+
+# The metadata having their own column, the other ones are in the metadata column, as JSON.
+_OWN_META = frozenset(('filename', 'lineno', 'worked_period', extract.DUPLICATE_META))
+
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+CSV_OPENERS = {'.gz': gzip.open, '.xz': lzma.open}
+
+
+def exportFormat(filename):
+    """Return the format of the export file, from its extension.
+
+A ValueError is raised if the extension is not one of FORMATS."""
+    name, extension = path.splitext(filename)
+    if extension in CSV_OPENERS:
+        name, extension = path.splitext(name)
+        if extension != '.csv':
+            raise ValueError("Unknown export format: {}".format(filename))
+
+    export_format = FORMATS.get(extension.lower())
+    if export_format is None:
+        raise ValueError("Unknown export format: {}".format(filename))
+    return export_format
+
+
+def checkExport(filename):
+    """Return the format of the export file, once checked it can be written.
+
+A ValueError is raised if the extension is not one of FORMATS, an OSError if
+the format needs the pyarrow package and it is not installed. pyarrow is
+only looked for, not imported."""
+    export_format = exportFormat(filename)
+    if export_format != 'csv' and importlib.util.find_spec('pyarrow') is None:
+        raise OSError("The pyarrow package is needed to write {}".format(filename))
+    return export_format
+
+
+def toRows(entries):
+    """Yield a tuple of the values of COLUMNS per posting of the transactions.
+
+The numbers are Decimal objects, the dates datetime.date objects, the values
+missing None."""
+    for entry in entries:
+        if not isinstance(entry, data.Transaction):
+            continue
+
+        meta = entry.meta or {}
+        others = {key: str(value) for key, value in meta.items()
+                  if key not in _OWN_META and not key.startswith('__')}
+        common = (meta.get('worked_period'), bool(meta.get(extract.DUPLICATE_META)),
+                  meta.get('filename'), meta.get('lineno'),
+                  json.dumps(others, sort_keys=True) if others else None)
+
+        for posting in entry.postings:
+            units, price = posting.units, posting.price
+            yield (entry.date, entry.flag, entry.payee, entry.narration,
+                   posting.account, posting.flag,
+                   units.number if units is not None else None,
+                   units.currency if units is not None else None,
+                   price.number if price is not None else None,
+                   price.currency if price is not None else None) + common
+
+
+def exportCsv(entries, filename):
+    """Write the rows of the transactions to a CSV file, with a header, compressed
+according to its extension."""
+    opener = CSV_OPENERS.get(path.splitext(filename)[1], open)
+    with opener(filename, 'wt', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(COLUMNS)
+        writer.writerows(toRows(entries))
+
+
+def _pyarrow(filename):
+    # pyarrow is slow to import and optional, it is only imported for an export needing it.
+    try:
+        return importlib.import_module('pyarrow')
+    except ImportError:
+        raise OSError("The pyarrow package is needed to write {}".format(filename))
+
+
+def toTable(entries, pyarrow):
+    """Return the rows of the transactions as a pyarrow.Table."""
+    columns = list(zip(*toRows(entries))) or [()] * len(COLUMNS)
+    types = {'date': pyarrow.date32(), 'number': pyarrow.decimal128(28, 8),
+             'price_number': pyarrow.decimal128(28, 8), 'duplicate': pyarrow.bool_(),
+             'lineno': pyarrow.int64()}
+    return pyarrow.table({name: pyarrow.array(values, types.get(name, pyarrow.string()))
+                          for name, values in zip(COLUMNS, columns)})
+
+
+def exportArrow(entries, filename, export_format='arrow'):
+    """Write the rows of the transactions to a Parquet or Arrow IPC file."""
+    pyarrow = _pyarrow(filename)
+    table = toTable(entries, pyarrow)
+    if export_format == 'parquet':
+        importlib.import_module('pyarrow.parquet').write_table(table, filename)
+    else:
+        importlib.import_module('pyarrow.feather').write_feather(table, filename)
+
+
+def export(entries, filename):
+    """Write the rows of the transactions to the file, in the format of its extension."""
+    export_format = exportFormat(filename)
+    if export_format == 'csv':
+        exportCsv(entries, filename)
+    else:
+        exportArrow(entries, filename, export_format)
@@ -0,0 +1,98 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""A persistent cache of the results of the importers identify method."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import atexit
+import json
+import os
+import time
+
+from utils.utils import writeJson
+
+
+class IdentificationCache:
+    """A cache of identification results, stored as a JSON file.
+
+An entry is keyed on the importer name and the absolute path of the file,
+and records the size and modification time of the file when it was
+identified. The entry is ignored, and the file identified again, as soon as
+the size or the modification time of the file changes, or when the entry is
+older than max_age seconds. Entries of files that no longer exist are
+dropped when the cache is saved.
+
+The cache is saved when the program exits, if it has been modified."""
+
+    VERSION = 1
+
+    def __init__(self, filename, max_age=None, autosave=True):
+        self.filename = filename
+        self.max_age = max_age
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+        try:
+            with open(filename) as cache_file:
+                content = json.load(cache_file)
+            if content.get('version') == self.VERSION:
+                self.entries = content['entries']
+        except (OSError, ValueError):
+            pass
+
+        if autosave:
+            atexit.register(self.save)
+
+    @staticmethod
+    def __key(importer_name, filename):
+        return "{}|{}".format(importer_name, os.path.abspath(filename))
+
+    @staticmethod
+    def __stat(filename):
+        stat = os.stat(filename)
+        return stat.st_size, stat.st_mtime_ns
+
+    def get(self, importer_name, filename):
+        """Return the cached identification result of the file or None if it must be identified."""
+        entry = self.entries.get(self.__key(importer_name, filename))
+
+        try:
+            valid = (entry is not None
+                     and [entry['size'], entry['mtime']] == list(self.__stat(filename))
+                     and (self.max_age is None or time.time() - entry['checked'] <= self.max_age))
+        except OSError:
+            valid = False
+
+        if not valid:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry['result']
+
+    def put(self, importer_name, filename, result):
+        """Record the identification result of the file."""
+        try:
+            size, mtime = self.__stat(filename)
+        except OSError:
+            return
+
+        self.entries[self.__key(importer_name, filename)] = {
+            'size': size, 'mtime': mtime, 'checked': time.time(), 'result': bool(result)}
+        self.dirty = True
+
+    def prune(self):
+        """Drop the entries of the files that no longer exist."""
+        for key in [key for key in self.entries if not os.path.exists(key.split('|', 1)[1])]:
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        """Write the cache to its file, if it has been modified."""
+        if not self.dirty:
+            return
+        self.prune()
+
+        writeJson(self.filename, {'version': self.VERSION, 'entries': self.entries})
+        self.dirty = False
@@ -0,0 +1,252 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Measurement of the time spent in the importers methods, without modifying them.
+
+The importers of a configuration are wrapped, and every call of identify,
+file_name, file_account, file_date and extract is recorded with its wall
+clock and CPU times. For extract, the number of rows read, of entries
+emitted, of bytes of the file and the time of the phases of the extraction
+timed by the importer are recorded too. Usage, in a configuration file:
+
+    from utils import instrument
+    CONFIG = instrument.instrument(CONFIG, "metrics.json")
+
+The records are saved when the program exits, as JSON or, for a file name
+ending in .prom, in the Prometheus text format. A cProfile profile of the
+calls and the peak of memory allocated by each call can be added."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import atexit
+import cProfile
+import collections
+import os
+import time
+import tracemalloc
+
+from beancount.ingest import importer
+
+from utils.utils import extractArguments, writeJson
+
+
+class PhaseTimer:
+    """The time spent in the phases of an extraction and the counters of what it read.
+
+An importer with a phase_timer attribute gets a new PhaseTimer in it for each
+instrumented call of extract, and None otherwise."""
+
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self.counters = {}
+
+    def add(self, phase, start):
+        """Add the time elapsed since start, a value of clock(), to the phase."""
+        self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def iterate(self, phase, iterable):
+        """Yield the items of the iterable, adding the time spent to get them to the phase."""
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        elapsed = 0.0
+
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += clock() - start
+                    return
+                elapsed += clock() - start
+                yield item
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+    def remainder(self, phase, start):
+        """Add to the phase the time elapsed since start not already added to a phase."""
+        self.phases[phase] = self.phases.get(phase, 0.0) + max(
+            0.0, time.perf_counter() - start - sum(self.phases.values()))
+
+    def count(self, counter, value):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+
+class Recorder:
+    """The records of the calls of the instrumented importers.
+
+Parameters:
+- profile, if true, the calls are profiled with cProfile.
+- trace, if true, the peak of memory allocated during each call is measured
+  with tracemalloc, which slows down the calls."""
+
+    def __init__(self, profile=False, trace=False):
+        self.records = []
+        self.profiler = cProfile.Profile() if profile else None
+        self.trace = trace
+
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def call(self, wrapped, method, file, *args, **kwargs):
+        """Call the method of the wrapped importer on the file and record it."""
+        timer = None
+        if method == 'extract' and hasattr(wrapped, 'phase_timer'):
+            timer = wrapped.phase_timer = PhaseTimer()
+
+        if self.trace:
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if self.profiler is not None:
+            self.profiler.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+
+        try:
+            result = getattr(wrapped, method)(file, *args, **kwargs)
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if self.profiler is not None:
+                self.profiler.disable()
+            if timer is not None:
+                wrapped.phase_timer = None
+
+        record = {'importer': wrapped.name(), 'method': method, 'file': file.name,
+                  'wall': wall, 'cpu': cpu}
+        if self.trace:
+            record['memory_peak'] = tracemalloc.get_traced_memory()[1] - memory
+        if method == 'extract':
+            record['entries'] = len(result or ())
+            try:
+                record['bytes'] = os.path.getsize(file.name)
+            except OSError:
+                record['bytes'] = None
+            if timer is not None:
+                record['rows'] = timer.counters.get('rows')
+                record['phases'] = dict(timer.phases)
+
+        self.records.append(record)
+        return result
+
+    def summary(self):
+        """Return the totals of the records per importer and method, as a list of dicts."""
+        totals = collections.OrderedDict()
+        for record in self.records:
+            key = (record['importer'], record['method'])
+            total = totals.setdefault(key, {'importer': key[0], 'method': key[1], 'calls': 0,
+                                            'wall': 0.0, 'cpu': 0.0})
+            total['calls'] += 1
+            total['wall'] += record['wall']
+            total['cpu'] += record['cpu']
+            for counter in ('rows', 'entries', 'bytes'):
+                if record.get(counter) is not None:
+                    total[counter] = total.get(counter, 0) + record[counter]
+            for phase, seconds in record.get('phases', {}).items():
+                phases = total.setdefault('phases', {})
+                phases[phase] = phases.get(phase, 0.0) + seconds
+
+        return list(totals.values())
+
+    def toJson(self):
+        return {'records': self.records, 'summary': self.summary()}
+
+    def toPrometheus(self):
+        """Return the totals of the records in the Prometheus text exposition format."""
+        metrics = (
+            ('importer_calls_total', "Number of calls of the importer methods.", 'calls'),
+            ('importer_wall_seconds_total', "Wall clock time spent in the importer methods.", 'wall'),
+            ('importer_cpu_seconds_total', "CPU time spent in the importer methods.", 'cpu'),
+            ('importer_rows_total', "Number of rows read by extract.", 'rows'),
+            ('importer_entries_total', "Number of entries emitted by extract.", 'entries'),
+            ('importer_bytes_total', "Size of the files extracted.", 'bytes'),
+        )
+        summary = self.summary()
+        lines = []
+
+        for metric, description, field in metrics:
+            lines.append("# HELP {} {}".format(metric, description))
+            lines.append("# TYPE {} counter".format(metric))
+            for total in summary:
+                if field in total:
+                    lines.append('{}{{importer="{}",method="{}"}} {}'.format(
+                        metric, _escape(total['importer']), total['method'], total[field]))
+
+        metric = 'importer_extract_phase_seconds_total'
+        lines.append("# HELP {} Wall clock time spent in the phases of extract.".format(metric))
+        lines.append("# TYPE {} counter".format(metric))
+        for total in summary:
+            for phase, seconds in total.get('phases', {}).items():
+                lines.append('{}{{importer="{}",phase="{}"}} {}'.format(
+                    metric, _escape(total['importer']), phase, seconds))
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, filename, format=None):
+        """Save the records in the file, in the Prometheus format if format is 'prometheus' or
+the file name ends with .prom, as JSON otherwise. The profile, if any, is saved in
+the file name followed by .prof."""
+        if format is None:
+            format = 'prometheus' if filename.endswith('.prom') else 'json'
+
+        if format == 'prometheus':
+            with open(filename, 'w') as output:
+                output.write(self.toPrometheus())
+        else:
+            writeJson(filename, self.toJson())
+
+        if self.profiler is not None:
+            self.profiler.dump_stats(filename + '.prof')
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class InstrumentedImporter(importer.ImporterProtocol):
+    """An importer recording the calls of the methods of the wrapped importer.
+
+The other attributes are the ones of the wrapped importer."""
+
+    def __init__(self, wrapped, recorder):
+        self.wrapped = wrapped
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        # Only called for the attributes not found on the wrapper itself.
+        if name == 'wrapped':
+            raise AttributeError(name)
+        return getattr(self.wrapped, name)
+
+    def name(self):
+        return self.wrapped.name()
+
+    def identify(self, file):
+        return self.recorder.call(self.wrapped, 'identify', file)
+
+    def file_name(self, file):
+        return self.recorder.call(self.wrapped, 'file_name', file)
+
+    def file_account(self, file):
+        return self.recorder.call(self.wrapped, 'file_account', file)
+
+    def file_date(self, file):
+        return self.recorder.call(self.wrapped, 'file_date', file)
+
+    def extract(self, file, existing_entries=None):
+        return self.recorder.call(self.wrapped, 'extract', file,
+                                  **extractArguments(self.wrapped, existing_entries))
+
+
+def instrument(config, output=None, profile=False, trace=False, recorder=None):
+    """Return the importers of the configuration wrapped to record their calls.
+
+Parameters:
+- config, the list of importers.
+- output, the file the records are saved in when the program exits, if any.
+- profile, trace, see Recorder.
+- recorder, the Recorder to use, a new one by default."""
+    if recorder is None:
+        recorder = Recorder(profile, trace)
+    if output is not None:
+        atexit.register(recorder.save, output)
+
+    return [InstrumentedImporter(wrapped, recorder) for wrapped in config]
@@ -0,0 +1,106 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Logging facilities shared by the importers."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(lineno)d - %(funcName)s | %(message)s'
+DEFAULT_LEVEL = logging.WARNING
+
+# The handler queuing the records of each (process, name, sink) for its
+# background thread, so a logger created again reuses the thread.
+_queue_handlers = {}
+_queue_lock = threading.Lock()
+
+
+def toLevel(level):
+    """Convert a level name (DEBUG, info,...) or number to a logging level number."""
+    if isinstance(level, int):
+        return level
+
+    level = str(level).strip()
+    if level.isdigit():
+        return int(level)
+
+    value = logging.getLevelName(level.upper())
+    if not isinstance(value, int):
+        raise ValueError("Unknown log level: {}".format(level))
+
+    return value
+
+
+def toHandler(sink):
+    """Return a logging handler for the sink.
+
+Parameters:
+- sink, a logging.Handler, a stream, '-' for the standard error or a file name.
+  A file is only opened when the first record is emitted."""
+    if isinstance(sink, logging.Handler):
+        return sink
+    if sink == '-':
+        return logging.StreamHandler(sys.stderr)
+    if hasattr(sink, 'write'):
+        return logging.StreamHandler(sink)
+
+    return logging.FileHandler(sink, delay=True)
+
+
+def getLogger(name, level=None, sink=None, queued=None):
+    """Return a logger for an importer.
+
+Every parameter left to None is read from the environment variables
+<NAME>_LOG_LEVEL, <NAME>_LOG_FILE and <NAME>_LOG_QUEUE, then falls back
+to the default value.
+
+Parameters:
+- name, the name of the logger.
+- level, the minimum level of the records to emit, WARNING by default.
+- sink, where the records are written (see toHandler), '<name>-importer.log' by default.
+- queued, if true, the records are written by a background thread, so the
+  file I/O does not block the caller. One thread is started per name and
+  sink, and shared by the loggers created with them."""
+    prefix = name.upper().replace('-', '_')
+
+    if level is None:
+        level = os.environ.get(prefix + '_LOG_LEVEL', DEFAULT_LEVEL)
+    if sink is None:
+        sink = os.environ.get(prefix + '_LOG_FILE', '{}-importer.log'.format(name))
+    if queued is None:
+        queued = os.environ.get(prefix + '_LOG_QUEUE', '').lower() in ('1', 'true', 'yes')
+
+    logger = logging.Logger(name, toLevel(level))
+
+    if queued:
+        logger.addHandler(_queueHandler(name, sink))
+    else:
+        logger.addHandler(_formatted(toHandler(sink)))
+
+    return logger
+
+
+def _formatted(handler):
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def _queueHandler(name, sink):
+    """Return the handler queuing the records for the thread writing them to the sink."""
+    # The process is part of the key, a forked process does not have the thread of its parent.
+    key = (os.getpid(), name, sink)
+    with _queue_lock:
+        queue_handler = _queue_handlers.get(key)
+        if queue_handler is None:
+            records = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(records, _formatted(toHandler(sink)))
+            listener.start()
+            atexit.register(listener.stop)
+            queue_handler = _queue_handlers[key] = logging.handlers.QueueHandler(records)
+
+    return queue_handler
@@ -0,0 +1,50 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Conversion of the PDF files to text, for the importers of PDF documents.
+
+The pdftotext program of poppler is used when it is found, with its -layout
+option so the columns of a table stay on the same line. Otherwise the pdfminer
+package is used. The conversion is the slow part of the processing of a PDF
+file, its result is meant to be kept in a utils.contentcache.ContentCache."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import importlib
+import io
+import shutil
+import subprocess
+
+PDFTOTEXT = shutil.which('pdftotext')
+
+
+def toText(filename):
+    """Return the text of the PDF file.
+
+An OSError is raised if neither pdftotext nor pdfminer is available or the
+file can not be converted."""
+    if PDFTOTEXT is not None:
+        try:
+            process = subprocess.run([PDFTOTEXT, '-layout', '-enc', 'UTF-8', filename, '-'],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        except subprocess.CalledProcessError as error:
+            raise OSError("pdftotext failed on {}: {}".format(
+                filename, error.stderr.decode('utf-8', 'replace').strip()))
+        return process.stdout.decode('utf-8', 'replace')
+
+    # pdfminer is slow to import, it is only imported when a file is converted with it.
+    try:
+        high_level = importlib.import_module('pdfminer.high_level')
+        layout = importlib.import_module('pdfminer.layout')
+    except ImportError:
+        raise OSError("pdftotext or the pdfminer package is needed to read {}".format(filename))
+
+    text = io.StringIO()
+    try:
+        with open(filename, 'rb') as pdf_file:
+            high_level.extract_text_to_fp(pdf_file, text, laparams=layout.LAParams())
+    except OSError:
+        raise
+    except Exception as error:
+        # pdfminer raises its own exceptions on damaged files.
+        raise OSError("pdfminer failed on {}: {}".format(filename, error))
+
+    return text.getvalue()
@@ -0,0 +1,142 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""The postings of the line items of an invoice, following a PostingPolicyEnum.
+
+A line item is an account, a net amount and a VAT rate in percent. The items
+of an invoice are read once, their net amounts summed by account and by rate
+as they go, so an invoice of thousands of lines, like the traffic details of
+a hosting provider, costs a time linear in its number of lines.
+
+The VAT is computed on the net total of each rate, with the multiplier of the
+rate computed once, and rounded to the cent, half to even. The amounts are
+computed in a fixed decimal context, whatever the context of the caller.
+
+When the postings of the accounts include the VAT, their amounts are rounded
+so their sum is exactly the net total plus the VAT, rounded to the cent: each one is rounded down,
+then the missing cents go to the accounts whose amounts lost the most, the
+first accounts of the invoice first on a tie. The same items always give the
+same postings."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import collections
+import decimal
+
+from beancount.core import amount
+from beancount.core import data
+
+from utils.utils import PostingPolicyEnum, VatBelgiumEnum
+
+CENT = decimal.Decimal('0.01')
+ZERO = decimal.Decimal(0)
+
+CONTEXT = decimal.Context(prec=28, rounding=decimal.ROUND_HALF_EVEN,
+                          traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow])
+
+# The multipliers giving the VAT of a net amount, by rate.
+MULTIPLIERS = {rate: CONTEXT.divide(decimal.Decimal(int(rate)), 100) for rate in VatBelgiumEnum}
+
+LineItem = collections.namedtuple('LineItem', 'account amount rate')
+LineItem.__doc__ = "A line of an invoice, the amount is without VAT and the rate is in percent."
+
+_GROUPED = (PostingPolicyEnum.SINGLE, PostingPolicyEnum.SINGLE_INCLUDE_VAT, PostingPolicyEnum.SINGLE_NO_VAT)
+_WITH_VAT_POSTING = (PostingPolicyEnum.SINGLE, PostingPolicyEnum.MULTI)
+
+
+class PostingEngine:
+    """The builder of the postings of the invoices, for a posting policy.
+
+Parameters:
+- posting_policy, a PostingPolicyEnum.
+- account_vat, the account of the VAT posting of the SINGLE and MULTI policies.
+- quantum, the smallest amount of the currency, the cent by default.
+
+A ValueError is raised if the posting policy is not a PostingPolicyEnum."""
+
+    def __init__(self, posting_policy, account_vat, quantum=CENT):
+        if not isinstance(posting_policy, PostingPolicyEnum):
+            raise ValueError("Unknown posting policy: {}".format(posting_policy))
+
+        self.posting_policy = posting_policy
+        self.account_vat = account_vat
+        self.quantum = quantum
+        self.multipliers = dict(MULTIPLIERS)
+
+    def multiplier(self, rate):
+        """Return the multiplier of the VAT rate in percent, computed once per rate."""
+        multiplier = self.multipliers.get(rate)
+        if multiplier is None:
+            multiplier = self.multipliers[rate] = CONTEXT.divide(decimal.Decimal(rate), 100)
+
+        return multiplier
+
+    def postings(self, items, currency, vat=None):
+        """Return the postings of the LineItems, following the posting policy.
+
+The vat is the total VAT of the invoice, when it is given by the invoice. It
+is used instead of the one computed from the rates, so the postings sum to
+the total of the invoice."""
+        grouped = self.posting_policy in _GROUPED
+        # The net amounts by account and rate, then by rate, in order of appearance.
+        by_account = collections.OrderedDict()
+        by_rate = collections.OrderedDict()
+        lines = []
+
+        with decimal.localcontext(CONTEXT):
+            for item in items:
+                key = (item.account, item.rate)
+                by_account[key] = by_account.get(key, ZERO) + item.amount
+                by_rate[item.rate] = by_rate.get(item.rate, ZERO) + item.amount
+                if not grouped:
+                    lines.append((item.account, item.amount))
+
+            computed_vat = sum((self.__round(net * self.multiplier(rate))
+                                for rate, net in by_rate.items()), ZERO)
+            if vat is None:
+                vat = computed_vat
+
+            if self.posting_policy is PostingPolicyEnum.SINGLE_INCLUDE_VAT:
+                lines = self.__includeVat(by_account, sum(by_rate.values(), ZERO) + vat)
+            elif grouped:
+                lines = self.__byAccount(by_account)
+
+            if self.posting_policy in _WITH_VAT_POSTING and vat:
+                lines.append((self.account_vat, vat))
+
+        return [data.Posting(account, amount.Amount(number, currency), None, None, None, None)
+                for account, number in lines]
+
+    def __round(self, number, rounding=decimal.ROUND_HALF_EVEN):
+        return number.quantize(self.quantum, rounding)
+
+    @staticmethod
+    def __byAccount(by_account):
+        totals = collections.OrderedDict()
+        for (account, _), net in by_account.items():
+            totals[account] = totals.get(account, ZERO) + net
+
+        return list(totals.items())
+
+    def __includeVat(self, by_account, total):
+        """Return the amounts with VAT of the accounts, rounded so they sum to the total,
+itself rounded to the quantum."""
+        total = self.__round(total)
+        exact = collections.OrderedDict()
+        for (account, rate), net in by_account.items():
+            exact[account] = exact.get(account, ZERO) + net + net * self.multiplier(rate)
+
+        accounts = list(exact)
+        rounded = [self.__round(exact[account], decimal.ROUND_FLOOR) for account in accounts]
+        if not accounts:
+            return []
+
+        # The number of quanta to add, or to remove if negative, to reach the total.
+        missing = int((total - sum(rounded, ZERO)) / self.quantum)
+        if missing >= 0:
+            order = sorted(range(len(accounts)), key=lambda index: (rounded[index] - exact[accounts[index]], index))
+        else:
+            order = sorted(range(len(accounts)), key=lambda index: (exact[accounts[index]] - rounded[index], index))
+        step = self.quantum if missing > 0 else -self.quantum
+        for position in range(abs(missing)):
+            rounded[order[position % len(order)]] += step
+
+        return list(zip(accounts, rounded))
@@ -0,0 +1,79 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""A factory of interned amounts and postings for the importers.
+
+The transactions created by an importer reuse a handful of accounts and
+values (a day or half a day of vacation, the standard work period...), and
+the Amount and Posting objects are immutable tuples, so they are built once
+and shared by all the transactions."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+from beancount.core import data
+
+from utils.utils import toAmount
+
+
+def _amountKey(units):
+    # The string of the number, as 0.5 and 0.50 are equal amounts printed differently.
+    return None if units is None else (str(units.number), units.currency)
+
+
+class PostingFactory:
+    """Interned Amount and Posting objects.
+
+At most maxsize postings and negated amounts are kept, the caches are
+emptied when they are full. The hits and misses attributes count the
+postings found in, or added to, the cache."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._postings = {}
+        self._negatives = {}
+
+    def __getstate__(self):
+        # The caches are rebuilt by each process rather than pickled.
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxsize'])
+
+    def amount(self, value, commodity):
+        """Return the interned Amount of the value in the commodity."""
+        return toAmount(value, commodity)
+
+    def negative(self, units):
+        """Return the interned opposite of the Amount."""
+        key = _amountKey(units)
+        negative = self._negatives.get(key)
+        if negative is None:
+            if len(self._negatives) >= self.maxsize:
+                self._negatives.clear()
+            negative = self._negatives[key] = -units
+
+        return negative
+
+    def posting(self, account, units, price=None, flag=None):
+        """Return the interned Posting of the units on the account, without cost nor metadata."""
+        key = (account, _amountKey(units), _amountKey(price), flag)
+        posting = self._postings.get(key)
+        if posting is None:
+            self.misses += 1
+            if len(self._postings) >= self.maxsize:
+                self._postings.clear()
+            posting = self._postings[key] = data.Posting(account, units, None, price, flag, None)
+        else:
+            self.hits += 1
+
+        return posting
+
+    def transfer(self, account_in, account_out, units):
+        """Return the list of postings moving the units from account_out to account_in."""
+        return [self.posting(account_in, units),
+                self.posting(account_out, self.negative(units))]
+
+    def cacheInfo(self):
+        """Return the hits, misses and sizes of the caches."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'postings': len(self._postings), 'negatives': len(self._negatives)}
@@ -0,0 +1,56 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""Parsing of the time periods and dates found in the importers input files.
+
+The values of a file repeat a lot (a few dozen distinct [H]H:MM periods and
+about 31 distinct days per month), so the results are kept in bounded LRU
+caches shared by all the importers."""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import datetime
+import functools
+import re
+
+TIME_CACHE_SIZE = 1024
+DATE_CACHE_SIZE = 4096
+
+time_regex = re.compile("([0-9]{1,2}):([0-5][0-9])")
+date_regex = re.compile("([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})")
+
+
+@functools.lru_cache(maxsize=TIME_CACHE_SIZE)
+def toMinutes(value):
+    """Convert a time period in the [H]H:MM format into a number of minutes as an int.
+
+A ValueError is raised if the value is not in that format."""
+    match = time_regex.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError("Parameter was not a string  of the form [H]H:MM: {}".format(value))
+
+    hours, minutes = match.groups()
+    return int(hours) * 60 + int(minutes)
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def toDate(value):
+    """Convert a date in the [D]D/MM/YYYY format into a datetime.date object.
+
+A ValueError is raised if the value is not in that format or not a valid date."""
+    match = date_regex.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError("time data {!r} does not match format '%d/%m/%Y'".format(value))
+
+    day, month, year = match.groups()
+    return datetime.date(int(year), int(month), int(day))
+
+
+def cacheInfo():
+    """Return the hits, misses and sizes of the caches, per parsing function name."""
+    return {function.__name__: function.cache_info()._asdict()
+            for function in (toMinutes, toDate)}
+
+
+def clearCaches():
+    """Empty the caches and reset their counters."""
+    toMinutes.cache_clear()
+    toDate.cache_clear()
@@ -5,13 +5,30 @@ __license__ = "GNU GPLv2"
 from beancount.core import amount
 from enum import Enum, IntEnum, unique, auto
 import decimal
+import functools
+import inspect
+import json
+import os
+import tempfile
 
 
 class Policy:
-    """A Generic policy class."""
+    """A Generic policy class.
+
+The importers call validate once, when they are created, so an invalid
+policy fails before any file is processed."""
     def validate(self):
-        """A validator of the data held by the object."""
-        pass
+        """A validator of the data held by the object, raising a ValueError if it is not valid.
+
+The posting_policy and vat_rate attributes, when the policy has them, must be
+a PostingPolicyEnum and a VatBelgiumEnum."""
+        posting_policy = getattr(self, 'posting_policy', None)
+        if posting_policy is not None and not isinstance(posting_policy, PostingPolicyEnum):
+            raise ValueError("Unknown posting policy: {}".format(posting_policy))
+
+        vat_rate = getattr(self, 'vat_rate', None)
+        if vat_rate is not None and not isinstance(vat_rate, VatBelgiumEnum):
+            raise ValueError("Unknown VAT rate: {}".format(vat_rate))
 
 
 @unique
@@ -29,13 +46,70 @@ class PostingPolicyEnum(Enum):
     SINGLE_NO_VAT = auto()  # One posting per account and no posting for VAT
 
 
+AMOUNT_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=AMOUNT_CACHE_SIZE, typed=True)
+def _internAmount(value, commodity):
+    return amount.Amount(decimal.Decimal(value), commodity)
+
+
 def toAmount(value, commodity):
     """Convert a python built-in value to an Amount object.
 
+The Amount objects of int, str and float values are interned: the same
+object is returned for the same value and commodity, which is safe as Amount
+and Decimal are immutable. Zero and NaN floats are not interned, as -0.0 and
+0.0 are equal but give different amounts.
+
 Parameters:
 - value, the value to convert to an amount.
 - commodity, the commodity (currency/unit) associated to the value."""
+    kind = type(value)
+    if kind is int or kind is str or (kind is float and value and value == value):
+        return _internAmount(value, commodity)
+
     atr = decimal.Decimal(value)
     atr = amount.Amount(atr, commodity)
 
     return atr
+
+
+def writeJson(filename, content):
+    """Write the content as JSON in the file, atomically.
+
+The content is written in a temporary file of the same directory, which then
+replaces the file, so a reader never sees a partially written file."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename) + '-')
+    try:
+        with os.fdopen(handle, 'w') as output:
+            json.dump(content, output)
+        os.replace(temporary, filename)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def extractArguments(importer, existing_entries=None):
+    """Return the keyword arguments of the extract method of the importer.
+
+The existing_entries are only given to the importers accepting them, as
+beancount does."""
+    if 'existing_entries' in inspect.signature(importer.extract).parameters:
+        return {'existing_entries': existing_entries}
+    return {}
+
+
+def forgetFile(filename):
+    """Drop the memo of the file kept by beancount.ingest.cache, so the next
+cache.get_file gives the conversions of its current content.
+
+The memos are in the private _CACHE dict of the module, up to beancount 2.3.
+With another version, without it, nothing is dropped."""
+    # Only imported when needed, it loads chardet.
+    from beancount.ingest import cache
+
+    memos = getattr(cache, '_CACHE', None)
+    if isinstance(memos, dict):
+        memos.pop(filename, None)
@@ -0,0 +1,411 @@
+# -*- eval: (git-auto-commit-mode 1) -*-
+"""A resident process importing the files of the download directories as they land.
+
+The importers of the configuration are built once and kept, with their
+caches, for the life of the process. The directories are watched with
+inotify on Linux, otherwise they are scanned every few seconds. A new or
+modified file is identified and extracted, and its entries are appended to
+a staging beancount file, to be reviewed and moved to the ledger. Usage:
+
+    python -m utils.watch exemple.import downloads/ -s staging.beancount [-e LEDGER] [-i INDEX] [-S SOCKET]
+
+The size and modification time of the files processed are saved next to the
+staging file, so a restarted process only imports the files changed since.
+The entries already in the staging file are not appended again, the ones of
+the ledger, if given, are appended commented out as bean-extract does.
+
+With a socket, the process answers the commands sent on it, one line each,
+with a line of JSON. The commands are status, scan, to look for changed
+files at once, import FILE, to import a file again, and stop:
+
+    python -m utils.watch --send status -S SOCKET"""
+__copyright__ = "Copyright (C) 2018  Roland Everaert"
+__license__ = "GNU GPLv2"
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+
+from beancount.ingest import cache
+from beancount.ingest import extract
+from beancount.ingest import identify
+from beancount.parser.parser import parse_file
+
+from utils import dedup
+from utils import serialize
+from utils.driver import loadConfig
+from utils.log import getLogger
+from utils.utils import forgetFile, writeJson
+
+POLL_INTERVAL = 2.0
+
+# The inotify events of a file written or moved in, and of a directory created.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """The directories watched with the inotify system calls of the Linux C library.
+
+An OSError is raised when creating it if inotify is not available."""
+
+    def __init__(self):
+        name = ctypes.util.find_library('c')
+        try:
+            self.libc = ctypes.CDLL(name, use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError("inotify is not available")
+
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+
+    def close(self):
+        os.close(self.fd)
+
+    def fileno(self):
+        return self.fd
+
+    def add(self, directory):
+        """Watch the directory and its sub-directories."""
+        for root, _, _ in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd >= 0:
+                self.directories[wd] = root
+
+    def read(self):
+        """Return the files written or moved into the directories since the last read.
+
+None is returned if events were lost, the directories must then be scanned."""
+        try:
+            buffer = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+
+        filenames = []
+        overflow = False
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, size = _EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + _EVENT.size:offset + _EVENT.size + size].rstrip(b'\0')
+            offset += _EVENT.size + size
+
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif wd in self.directories and name:
+                filename = os.path.join(self.directories[wd], os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.add(filename)
+                        filenames.extend(_walk([filename]))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    filenames.append(filename)
+
+        return None if overflow else filenames
+
+
+def _walk(directories):
+    """Yield the absolute names of the files of the directories, except the hidden ones."""
+    for directory in directories:
+        for root, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for name in filenames:
+                if not name.startswith('.'):
+                    yield os.path.abspath(os.path.join(root, name))
+
+
+def _stat(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Watcher:
+    """The importers of a configuration, importing the changed files of directories.
+
+Parameters:
+- config, the list of importers.
+- directories, the directories to watch.
+- staging, the beancount file the entries are appended to.
+- logger, the logger of the activity of the watcher.
+- ledger, the ledger to find the duplicates in, if any.
+- index, the file of the utils.dedup.DuplicateIndex of the ledger, if any.
+- poll, force the scan of the directories every poll seconds, even if inotify
+  is available."""
+
+    def __init__(self, config, directories, staging, logger, ledger=None, index=None, poll=None):
+        self.importers = config
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.staging = os.path.abspath(staging)
+        self.state_file = self.staging + '.state.json'
+        self.logger = logger
+        self.ledger = ledger
+        self.index_file = index
+        self.running = False
+        self.counters = {'files': 0, 'entries': 0, 'duplicates': 0, 'errors': 0}
+        self.last = None
+        # The files waiting for their size and modification time to stop changing.
+        self.pending = {}
+
+        try:
+            with open(self.state_file) as state_file:
+                self.processed = json.load(state_file)
+        except (OSError, ValueError):
+            self.processed = {}
+
+        self.staged = dedup.DuplicateIndex()
+        if os.path.exists(self.staging):
+            entries, _, _ = parse_file(self.staging)
+            self.staged.update(entries)
+        self.existing = None
+        if ledger is not None:
+            self.existing = dedup.DuplicateIndex.fromLedger(ledger, index)
+
+        self.inotify = None
+        if poll is None:
+            try:
+                self.inotify = Inotify()
+            except OSError as error:
+                self.logger.warning("Directories scanned every %s s: %s", POLL_INTERVAL, error)
+        self.poll = poll if poll is not None else POLL_INTERVAL
+        if self.inotify is not None:
+            for directory in self.directories:
+                self.inotify.add(directory)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+    def isIgnored(self, filename):
+        return filename == self.staging or filename.startswith(self.staging + '.') or \
+            os.path.basename(filename).startswith('.')
+
+    def scan(self, settle=True):
+        """Import the files of the directories changed since they were imported.
+
+With settle, a file is only imported once its size and modification time are
+the same on two scans, so a file still being written is not imported."""
+        count = 0
+        for filename in _walk(self.directories):
+            stat = _stat(filename)
+            if stat is None or self.isIgnored(filename) or self.processed.get(filename) == stat:
+                continue
+            if settle and self.pending.get(filename) != stat:
+                self.pending[filename] = stat
+                continue
+
+            self.pending.pop(filename, None)
+            count += self.importFile(filename)
+
+        return count
+
+    def importFile(self, filename):
+        """Identify and extract the file, append its new entries to the staging file.
+
+Return the number of importers that identified it."""
+        filename = os.path.abspath(filename)
+        stat = _stat(filename)
+        if stat is None:
+            return 0
+
+        # The memo of beancount would give the conversions of the previous content.
+        forgetFile(filename)
+        file = cache.get_file(filename)
+        if self.existing is not None and not self.existing.isUpToDate():
+            self.existing = dedup.DuplicateIndex.fromLedger(self.ledger, self.index_file)
+
+        matches = 0
+        for importer in self.importers:
+            try:
+                if not importer.identify(file):
+                    continue
+                entries = extract.extract_from_file(filename, importer)
+            except Exception as exc:
+                self.counters['errors'] += 1
+                self.logger.exception("Importer %s raised an unexpected error on %s: %s",
+                                      importer.name(), filename, exc)
+                continue
+
+            matches += 1
+            new_entries = [entry for entry in entries if not self.staged.isDuplicate(entry)]
+            if self.existing is not None:
+                new_entries = self.existing.mark(new_entries)
+            self.staged.update(new_entries)
+            self.counters['duplicates'] += len(entries) - len(new_entries)
+            self.counters['entries'] += len(new_entries)
+            if new_entries:
+                self.__stage(filename, new_entries)
+            self.logger.info("%s: %d entries staged by %s, %d already staged", filename,
+                             len(new_entries), importer.name(), len(entries) - len(new_entries))
+
+        forgetFile(filename)
+        self.counters['files'] += 1
+        self.last = filename
+        self.processed[filename] = stat
+        writeJson(self.state_file, self.processed)
+
+        return matches
+
+    def __stage(self, filename, entries):
+        is_new = not os.path.exists(self.staging) or os.path.getsize(self.staging) == 0
+        with open(self.staging, 'a') as output:
+            if is_new:
+                output.write(extract.HEADER)
+            output.write(identify.SECTION.format(filename))
+            output.write('\n')
+            serialize.printExtractedEntries(entries, output)
+
+    def status(self):
+        return dict(self.counters, last=self.last, staging=self.staging,
+                    watch='inotify' if self.inotify is not None else 'poll',
+                    pending=len(self.pending))
+
+    def command(self, line):
+        """Run a command received on the socket, return the answer as a dict."""
+        name, _, argument = line.strip().partition(' ')
+        if name == 'status':
+            return self.status()
+        if name == 'scan':
+            return {'imported': self.scan(settle=False)}
+        if name == 'import' and argument:
+            return {'identified': self.importFile(argument)}
+        if name == 'stop':
+            self.running = False
+            return {'stopped': True}
+
+        return {'error': "Unknown command: {}".format(line.strip())}
+
+    def __answer(self, server):
+        connection, _ = server.accept()
+        with connection:
+            connection.settimeout(5.0)
+            try:
+                with connection.makefile('rwb') as stream:
+                    line = stream.readline().decode('utf-8')
+                    try:
+                        answer = self.command(line)
+                    except Exception as exc:
+                        self.logger.exception("Command %r failed", line)
+                        answer = {'error': str(exc)}
+                    stream.write(json.dumps(answer).encode('utf-8') + b'\n')
+            except OSError as error:
+                self.logger.warning("Command not answered: %s", error)
+
+    def run(self, socket_path=None):
+        """Import the changed files, then the new ones as they land, until stopped."""
+        server = None
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(socket_path)
+            server.listen(4)
+
+        self.running = True
+        self.scan(settle=False)
+        next_scan = time.monotonic() + self.poll
+        self.logger.info("Watching %s", ", ".join(self.directories))
+
+        try:
+            while self.running:
+                sources = [source for source in (self.inotify, server) if source is not None]
+                if self.inotify is not None and not self.pending:
+                    timeout = None if server is None else 60.0
+                else:
+                    timeout = max(0.0, next_scan - time.monotonic())
+                try:
+                    ready, _, _ = select.select(sources, [], [], timeout)
+                except InterruptedError:
+                    continue
+
+                if server in ready:
+                    self.__answer(server)
+                if self.inotify is not None and self.inotify in ready:
+                    filenames = self.inotify.read()
+                    if filenames is None:
+                        self.scan(settle=False)
+                    for filename in filenames or ():
+                        if not self.isIgnored(filename) and self.processed.get(filename) != _stat(filename):
+                            self.importFile(filename)
+                if (self.inotify is None or self.pending) and time.monotonic() >= next_scan:
+                    self.scan()
+                    next_scan = time.monotonic() + self.poll
+        finally:
+            if server is not None:
+                server.close()
+                os.unlink(socket_path)
+            self.logger.info("Stopped, %s", self.status())
+
+
+def send(socket_path, command):
+    """Send the command to the watcher listening on the socket, return its answer."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile('rwb') as stream:
+            stream.write(command.encode('utf-8') + b'\n')
+            stream.flush()
+            return json.loads(stream.readline().decode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the downloaded files as they land")
+    parser.add_argument('config', nargs='?', help="Importers configuration file, defining CONFIG")
+    parser.add_argument('directories', nargs='*', help="Directories to watch")
+    parser.add_argument('-s', '--staging', help="Beancount file the entries are appended to")
+    parser.add_argument('-e', '--existing', metavar='LEDGER',
+                        help="Existing ledger, to comment out the duplicate entries")
+    parser.add_argument('-i', '--index', metavar='FILE',
+                        help="With --existing, the file of the hash index of the ledger")
+    parser.add_argument('-S', '--socket', help="Local socket to listen to, or to send the command to")
+    parser.add_argument('-p', '--poll', type=float, default=None, metavar='SECONDS',
+                        help="Scan the directories every SECONDS rather than using inotify")
+    parser.add_argument('--send', metavar='COMMAND',
+                        help="Send the command (status, scan, import FILE, stop) to the watcher")
+    parser.add_argument('--log-level', default='INFO', help="Level of the messages logged")
+    parser.add_argument('--log-file', default='-', help="File of the messages, - for the standard error")
+    args = parser.parse_args(argv)
+
+    if args.send is not None:
+        if args.socket is None:
+            parser.error("--send needs --socket")
+        print(json.dumps(send(args.socket, args.send)))
+        return
+
+    if args.config is None or not args.directories or args.staging is None:
+        parser.error("the configuration, the directories and --staging are needed")
+
+    logger = getLogger("watch", args.log_level, args.log_file)
+    watcher = Watcher(loadConfig(args.config), args.directories, args.staging, logger,
+                      args.existing, args.index, args.poll)
+
+    # Stopped as by Control-C, even while waiting for an event.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    try:
+        watcher.run(args.socket)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())